@@ -0,0 +1,90 @@
+"""Measure how long serpextract.might_be_serp takes to reject a referrer
+which isn't a SERP, compared to parsing it with urlparse:
+
+    $ PYTHONPATH=. python benchmarks/bench_prefilter.py
+
+The prefilter remembers its answer for each host, so rejecting a referrer
+whose host it wasn't asked about yet is measured apart from rejecting one
+whose host it knows. Both are reported against a target of rejecting a
+referrer in under a microsecond.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import time
+
+from six.moves.urllib.parse import urlparse
+
+import serpextract
+
+from corpus import CorpusConfig, generate_corpus
+
+_clock = time.perf_counter
+
+#: Time to reject a referrer the prefilter should stay under, in nanoseconds
+_target = 1000
+
+
+def _per_call(func, urls, repeat):
+    best = None
+    for _ in range(repeat):
+        start = _clock()
+        for url in urls:
+            func(url)
+        elapsed = (_clock() - start) / len(urls)
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--urls", type=int, default=100000, help="Number of URLs (default: 100000)."
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs of each timing (default: 5)."
+    )
+    args = parser.parse_args()
+
+    urls = generate_corpus(
+        CorpusConfig(size=args.urls, distinct=args.urls, non_serp_share=1.0)
+    )
+    might_be_serp = serpextract.might_be_serp
+    registry = serpextract.get_default_registry()
+    urls = [url for url in urls if not might_be_serp(url)]
+
+    # Forget the hosts before every call, minus the time to do so
+    hosts = registry.index.hosts
+
+    def new_host(url):
+        hosts.clear()
+        might_be_serp(url)
+
+    def clear_only(url):
+        hosts.clear()
+
+    cold = _per_call(new_host, urls, args.repeat) - _per_call(
+        clear_only, urls, args.repeat
+    )
+    warm = _per_call(might_be_serp, urls, args.repeat)
+    parsed = _per_call(urlparse, urls, args.repeat)
+    print("{:,} non-SERP referrers".format(len(urls)))
+    print("{:<30}{:>8.0f} ns".format("urlparse", parsed))
+    for name, elapsed in (
+        ("might_be_serp, new host", cold),
+        ("might_be_serp, known host", warm),
+    ):
+        print(
+            "{:<30}{:>8.0f} ns ({:.2f}x urlparse, {} the {} ns target)".format(
+                name,
+                elapsed,
+                elapsed / parsed,
+                "within" if elapsed < _target else "over",
+                _target,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
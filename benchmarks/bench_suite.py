@@ -0,0 +1,341 @@
+"""Benchmark serpextract over a synthetic corpus of referrers (see
+corpus.py) and write the results as JSON, optionally comparing them with the
+results of an earlier run, e.g. of another version:
+
+    $ PYTHONPATH=. python benchmarks/bench_suite.py --output new.json --compare old.json
+
+Measures the import time, the time to load the engine table from the
+compiled snapshot and to build it from search_engines.json, the latency
+percentiles of get_parser() and extract(), the throughput of extract(),
+extract_many() and extract_columns(), and the memory of a process before and
+after extracting.  Import times and memory are measured in fresh processes.
+
+The suite runs against older versions of serpextract too, leaving out what
+they can't measure (e.g. the snapshot or extract_many()), so that the
+results of an upgrade can be compared with the version it replaces.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import pkg_resources
+
+import serpextract
+from serpextract import serpextract as _module
+
+from corpus import OTHER_ENGINES_WEIGHT, CorpusConfig, generate_corpus
+
+_clock = time.perf_counter
+
+# Run in a fresh process to measure the import time, the time to load the
+# engine table and the memory used.  The resident set size is read from
+# /proc where there is one, otherwise the peak from getrusage is used, which
+# is in KiB on Linux and in bytes on macOS
+_process_script = """
+import json, os, sys, time
+start = time.perf_counter()
+import serpextract
+imported = time.perf_counter()
+if hasattr(serpextract, "get_default_registry"):
+    serpextract.get_default_registry().index
+else:
+    serpextract.serpextract._get_search_engines()
+loaded = time.perf_counter()
+result = {"import": imported - start, "load": loaded - imported}
+
+def rss():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+result["rss_loaded"] = rss()
+urls = json.load(sys.stdin)
+for url in urls:
+    serpextract.extract(url)
+result["rss_extracted"] = rss()
+print(json.dumps(result))
+"""
+
+
+def _percentiles(samples, percentiles=(50, 90, 99, 99.9)):
+    samples = sorted(samples)
+    result = {}
+    for percentile in percentiles:
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        result["p{:g}".format(percentile)] = samples[index] * 1e6
+    result["mean"] = sum(samples) / len(samples) * 1e6
+    return result
+
+
+def _median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def bench_process(urls, repeat):
+    """
+    Measure the import, load and memory of fresh processes.
+    """
+    runs = []
+    payload = json.dumps(urls).encode("utf-8")
+    for _ in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, "-c", _process_script],
+            input=payload,
+            env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        )
+        runs.append(json.loads(output.decode("utf-8")))
+    return {
+        key: _median([run[key] for run in runs])
+        for key in runs[0]
+        if runs[0][key] is not None
+    }
+
+
+def bench_build(repeat):
+    """
+    Measure loading the table from the compiled snapshot and building it
+    from the JSON definitions, for versions which have a snapshot.
+    """
+    registry_class = getattr(serpextract, "EngineRegistry", None)
+    build_engines = getattr(_module, "_build_search_engines", None)
+    if registry_class is None or build_engines is None:
+        return {}
+    definitions = pkg_resources.resource_string("serpextract", "search_engines.json")
+    load = []
+    build = []
+    for _ in range(repeat):
+        start = _clock()
+        registry_class.load(definitions).index
+        load.append(_clock() - start)
+        start = _clock()
+        registry_class(build_engines(_module._get_matomo_engines(definitions))).index
+        build.append(_clock() - start)
+    return {"snapshot": _median(load), "json": _median(build)}
+
+
+def bench_latency(func, urls):
+    """
+    Time every call of ``func`` on ``urls``.
+    """
+    samples = []
+    clock = _clock
+    for url in urls:
+        start = clock()
+        func(url)
+        samples.append(clock() - start)
+    return _percentiles(samples)
+
+
+def bench_throughput(func, urls, repeat):
+    """
+    Measure how many URLs per second ``func`` processes given all of them.
+    """
+    elapsed = []
+    for _ in range(repeat):
+        start = _clock()
+        func(urls)
+        elapsed.append(_clock() - start)
+    return len(urls) / _median(elapsed)
+
+
+def run(config, repeat, process_repeat):
+    urls = generate_corpus(config)
+    results = {"corpus": config.as_dict()}
+
+    results["process"] = bench_process(urls[:20000], process_repeat)
+    build = bench_build(repeat)
+    if build:
+        results["build"] = build
+
+    # Warm the table and caches
+    extracted = [serpextract.extract(url) for url in urls]
+    results["corpus"]["distinct_urls"] = len(set(urls))
+    results["corpus"]["serp_share"] = sum(r is not None for r in extracted) / len(urls)
+
+    sample = urls[: min(len(urls), 50000)]
+    results["latency_us"] = {
+        "get_parser": bench_latency(serpextract.get_parser, sample),
+        "extract": bench_latency(serpextract.extract, sample),
+    }
+    if hasattr(serpextract, "enable_result_cache"):
+        serpextract.enable_result_cache()
+        try:
+            results["latency_us"]["extract_cached"] = bench_latency(
+                serpextract.extract, sample
+            )
+        finally:
+            serpextract.disable_result_cache()
+
+    results["throughput_urls_per_s"] = {
+        "extract": bench_throughput(
+            lambda batch: [serpextract.extract(url) for url in batch], urls, repeat
+        ),
+    }
+    for name in ("extract_many", "extract_columns"):
+        func = getattr(serpextract, name, None)
+        if func is not None:
+            results["throughput_urls_per_s"][name] = bench_throughput(
+                func, urls, repeat
+            )
+    return results
+
+
+def _flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + key + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare(baseline, results):
+    """
+    Print the ratio of every measurement to the baseline's.
+    """
+    old = _flatten(baseline["results"])
+    new = _flatten(results["results"])
+    print("{:<48}{:>14}{:>14}{:>9}".format("", "baseline", "current", "ratio"))
+    for key in sorted(set(old) - set(new)):
+        if not key.startswith("corpus."):
+            print("{:<48}{:>14.6g}{:>14}".format(key, old[key], "-"))
+    for key in sorted(new):
+        if key.startswith("corpus."):
+            continue
+        if key not in old or not old[key]:
+            print("{:<48}{:>14}{:>14.6g}".format(key, "-", new[key]))
+            continue
+        print(
+            "{:<48}{:>14.6g}{:>14.6g}{:>8.2f}x".format(
+                key, old[key], new[key], new[key] / old[key]
+            )
+        )
+
+
+def _engine_weight(value):
+    name, _, weight = value.rpartition("=")
+    if not name:
+        raise argparse.ArgumentTypeError("expected NAME=WEIGHT, got {!r}".format(value))
+    return name, float(weight)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--size",
+        type=int,
+        default=100000,
+        help="Number of referrers (default: 100000).",
+    )
+    parser.add_argument(
+        "--distinct",
+        type=int,
+        default=20000,
+        help="Number of distinct referrers (default: 20000).",
+    )
+    parser.add_argument(
+        "--non-serp-share",
+        type=float,
+        default=0.4,
+        help="Share of distinct referrers which aren't SERPs (default: 0.4).",
+    )
+    parser.add_argument(
+        "--engine-weight",
+        type=_engine_weight,
+        action="append",
+        metavar="NAME=WEIGHT",
+        help="Weight of an engine's SERPs, e.g. Google=60; replaces the default mix "
+        "when given.",
+    )
+    parser.add_argument(
+        "--other-weight",
+        type=float,
+        default=OTHER_ENGINES_WEIGHT,
+        help="Weight shared by all other engines (default: {}).".format(
+            OTHER_ENGINES_WEIGHT
+        ),
+    )
+    parser.add_argument(
+        "--tail-share",
+        type=float,
+        default=0.3,
+        help="Share of referrers with tracking params (default: 0.3).",
+    )
+    parser.add_argument(
+        "--tail-length",
+        type=int,
+        default=8,
+        help="Maximum number of tracking params (default: 8).",
+    )
+    parser.add_argument(
+        "--zipf",
+        type=float,
+        default=1.0,
+        help="Exponent of the repeat distribution (default: 1.0).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs of each timing (default: 3)."
+    )
+    parser.add_argument(
+        "--process-repeat",
+        type=int,
+        default=5,
+        help="Fresh processes to start (default: 5).",
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument(
+        "--compare", help="Compare the results with this earlier JSON file."
+    )
+    args = parser.parse_args()
+
+    config = CorpusConfig(
+        size=args.size,
+        distinct=args.distinct,
+        non_serp_share=args.non_serp_share,
+        engine_weights=dict(args.engine_weight) if args.engine_weight else None,
+        other_weight=args.other_weight,
+        tail_share=args.tail_share,
+        tail_length=args.tail_length,
+        zipf=args.zipf,
+        seed=args.seed,
+    )
+    results = {
+        "serpextract": getattr(serpextract, "__version__", None),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": run(config, args.repeat, args.process_repeat),
+    }
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), results)
+    elif not args.output:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Measure the throughput of serpextract.extract_many when the same
+EngineRegistry is shared by several threads.
+
+On a regular CPython build threads take turns holding the GIL so throughput
+stays flat as threads are added; on a free-threaded build (python3.13t and
+later) it should grow with the number of cores.
+
+    python benchmarks/bench_threads.py --threads 1 2 4 8
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import sys
+import threading
+import time
+
+import serpextract
+
+from corpus import CorpusConfig, generate_corpus
+
+
+def run(registry, urls, num_threads, chunksize):
+    chunks = [urls[i : i + chunksize] for i in range(0, len(urls), chunksize)]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not chunks:
+                    return
+                chunk = chunks.pop()
+            serpextract.extract_many(chunk, registry=registry)
+
+    threads = [threading.Thread(target=worker) for _ in range(num_threads)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4, 8],
+        help="Numbers of threads to measure (default: 1 2 4 8).",
+    )
+    parser.add_argument(
+        "--urls", type=int, default=200000, help="Number of URLs (default: 200000)."
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=1000,
+        help="Number of URLs per extract_many call (default: 1000).",
+    )
+    args = parser.parse_args()
+
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", lambda: True)
+    print(
+        "Python {} ({})".format(
+            sys.version.split()[0],
+            "GIL enabled" if is_gil_enabled() else "free-threaded",
+        )
+    )
+    registry = serpextract.get_default_registry()
+    urls = generate_corpus(CorpusConfig(size=args.urls))
+    # Build the host index and warm the netloc cache outside of the timings
+    serpextract.extract_many(urls[: args.chunksize], registry=registry)
+
+    baseline = None
+    for num_threads in args.threads:
+        elapsed = run(registry, urls, num_threads, args.chunksize)
+        rate = len(urls) / elapsed
+        if baseline is None:
+            baseline = rate
+        print(
+            "{:>3} threads: {:>10,.0f} URLs/s ({:.2f}x)".format(
+                num_threads, rate, rate / baseline
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""Generate a synthetic corpus of referrers from the search engine
+definitions, for benchmarking.
+
+SERP URLs are built with each rule's ``backlink`` (see
+:meth:`serpextract.SearchEngineParser.get_serp_url`), with ``{}`` country
+code templates filled in and keywords encoded in the engine's charset.  Rules
+are read from the bundled ``search_engines.json`` rather than from the
+engine table, so that every version of serpextract benchmarks the same
+corpus.  They
+are mixed with non-SERP referrers (articles, social sites and search engine
+pages without a query) and some get a long tail of tracking params.  The
+corpus repeats URLs following a Zipf distribution, as real referrer logs do.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import bisect
+import itertools
+import json
+import random
+import string
+from collections import defaultdict, namedtuple
+
+import pkg_resources
+from six.moves.urllib.parse import quote_plus
+
+from serpextract.serpextract import _country_codes
+
+# Engine name weights of the default traffic mix; every other engine shares
+# OTHER_ENGINES_WEIGHT
+DEFAULT_ENGINE_WEIGHTS = {
+    "Google": 60,
+    "Bing": 12,
+    "Yahoo!": 6,
+    "Yandex": 4,
+    "Baidu": 3,
+    "DuckDuckGo": 2,
+}
+OTHER_ENGINES_WEIGHT = 13
+
+_words = (
+    "weather cheap flights python tutorial news today football scores recipe "
+    "chicken best laptop 2024 how to tie a tie map near me hotel paris "
+    "translate jobs remote stock price bitcoin movie times lyrics"
+).split()
+_foreign_words = (
+    "погода",
+    "новости",
+    "天气",
+    "新闻",
+    "東京",
+    "café",
+    "müller",
+    "élection",
+    "İstanbul",
+    "ağaç",
+)
+_non_serp_templates = (
+    "https://www.{word}{word2}.{tld}/{year}/{month:02d}/{slug}",
+    "http://blog.{word}.{tld}/posts/{slug}?ref=home",
+    "https://{word}.{tld}/",
+    "https://www.facebook.com/",
+    "https://l.facebook.com/l.php?u=https%3A%2F%2Fexample.com%2F{slug}",
+    "https://t.co/{token}",
+    "https://www.reddit.com/r/{word}/comments/{token}/{slug}/",
+    "https://news.ycombinator.com/item?id={number}",
+    "https://www.google.com/",
+    "https://mail.google.com/mail/u/0/",
+    "https://www.bing.com/maps?osid={token}",
+    "https://www.youtube.com/watch?v={token}",
+    "android-app://com.google.android.gm",
+)
+_tlds = ("com", "org", "net", "de", "co.uk", "fr", "io")
+_tracking_params = (
+    "utm_source",
+    "utm_medium",
+    "utm_campaign",
+    "utm_term",
+    "utm_content",
+    "gclid",
+    "fbclid",
+    "msclkid",
+    "ved",
+    "ei",
+    "sa",
+    "source",
+    "oq",
+    "aqs",
+    "sourceid",
+    "client",
+    "rlz",
+)
+
+
+# The definition of a match rule, with the attributes of a
+# serpextract.SearchEngineParser that SERP URLs are built from
+_Rule = namedtuple("_Rule", "engine_name keyword_extractor link_macro charsets")
+
+
+def _read_rules():
+    """
+    Return a ``dict`` of the match rules of the bundled
+    ``search_engines.json`` to their :class:`_Rule`.  Like serpextract, a
+    rule without params, backlink or charsets inherits them from the
+    previous rule of the same engine.
+    """
+    definitions = json.loads(
+        pkg_resources.resource_string("serpextract", "search_engines.json").decode(
+            "utf-8"
+        )
+    )
+    rules = {}
+    for engine_name, rule_group in definitions.items():
+        params = link_macro = None
+        charsets = ["utf-8"]
+        for rule in rule_group:
+            params = rule.get("params", params)
+            link_macro = rule.get("backlink", link_macro)
+            charsets = rule.get("charsets", charsets)
+            if not isinstance(params, list):
+                params = [params]
+            if not isinstance(charsets, list):
+                charsets = [charsets]
+            for match_rule in rule["urls"]:
+                rules[match_rule] = _Rule(engine_name, params, link_macro, charsets)
+    return rules
+
+
+def _token(rng, length):
+    return "".join(
+        rng.choice(string.ascii_letters + string.digits) for _ in range(length)
+    )
+
+
+def _keyword(rng):
+    words = [rng.choice(_words) for _ in range(rng.randint(1, 4))]
+    if rng.random() < 0.1:
+        words.append(rng.choice(_foreign_words))
+    return " ".join(words)
+
+
+def _fill_host(host, rng):
+    """
+    Replace the ``{}`` country code template of a match rule's host.
+    """
+    if "{}" not in host:
+        return host
+    country_code = rng.choice(_country_codes)
+    if host.endswith("{}") and rng.random() < 0.3:
+        country_code = rng.choice(("co.", "com.")) + country_code
+    return host.replace("{}", country_code)
+
+
+def _serp_url(match_rule, rule, rng):
+    """
+    Build a SERP URL for a match rule, or ``None`` if the rule has no way to
+    link to one.
+
+    :type rule: :class:`_Rule`
+    """
+    host = match_rule.partition("/")[0]
+    if not host or "//" in match_rule:
+        return None
+    link_macro = rule.link_macro
+    if link_macro is None:
+        params = [
+            e
+            for e in rule.keyword_extractor
+            if isinstance(e, str) and not e.startswith("/")
+        ]
+        if not params:
+            return None
+        link_macro = "search?{}={{k}}".format(params[0])
+    charset = rule.charsets[0] if rule.charsets else "utf-8"
+    try:
+        keyword = quote_plus(_keyword(rng).encode(charset))
+    except (LookupError, UnicodeEncodeError):
+        keyword = quote_plus(" ".join(rng.sample(_words, 2)))
+    scheme = "https" if rng.random() < 0.8 else "http"
+    base_url = "{}://{}".format(scheme, _fill_host(host, rng))
+    return "{}/{}".format(base_url, link_macro.lstrip("/").format(k=keyword))
+
+
+def _non_serp_url(rng):
+    template = rng.choice(_non_serp_templates)
+    return template.format(
+        word=rng.choice(_words),
+        word2=rng.choice(_words),
+        tld=rng.choice(_tlds),
+        year=rng.randint(2010, 2024),
+        month=rng.randint(1, 12),
+        slug="-".join(rng.sample(_words, 4)),
+        token=_token(rng, 11),
+        number=rng.randint(1000000, 40000000),
+    )
+
+
+def _add_tail(url, length, rng):
+    params = rng.sample(_tracking_params, min(length, len(_tracking_params)))
+    tail = "&".join(
+        "{}={}".format(param, _token(rng, rng.randint(4, 40))) for param in params
+    )
+    return url + ("&" if "?" in url else "?") + tail
+
+
+class CorpusConfig(object):
+    """
+    The traffic mix of a corpus.
+
+    :param size:               Number of referrers in the corpus.
+    :param distinct:           Number of distinct referrers they are drawn
+                               from.
+    :param non_serp_share:     Share of distinct referrers which aren't SERPs.
+    :param engine_weights:     ``dict`` of engine names to weights, see
+                               ``DEFAULT_ENGINE_WEIGHTS``.
+    :param other_weight:       Weight shared by every other engine.
+    :param tail_share:         Share of referrers with tracking params.
+    :param tail_length:        Maximum number of tracking params.
+    :param zipf:               Exponent of the distribution of repeats, 0 for
+                               uniform.
+    :param seed:               Seed of the random number generator.
+    """
+
+    def __init__(
+        self,
+        size=100000,
+        distinct=20000,
+        non_serp_share=0.4,
+        engine_weights=None,
+        other_weight=OTHER_ENGINES_WEIGHT,
+        tail_share=0.3,
+        tail_length=8,
+        zipf=1.0,
+        seed=0,
+    ):
+        self.size = size
+        self.distinct = distinct
+        self.non_serp_share = non_serp_share
+        self.engine_weights = dict(
+            DEFAULT_ENGINE_WEIGHTS if engine_weights is None else engine_weights
+        )
+        self.other_weight = other_weight
+        self.tail_share = tail_share
+        self.tail_length = tail_length
+        self.zipf = zipf
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _engine_picker(config, rng):
+    """
+    Return a function picking a ``(match_rule, rule)`` pair according to
+    the engine weights of ``config``.
+    """
+    rules_by_engine = defaultdict(list)
+    for match_rule, rule in sorted(_read_rules().items()):
+        rules_by_engine[rule.engine_name].append((match_rule, rule))
+
+    choices = []
+    weights = []
+    others = [
+        name for name in sorted(rules_by_engine) if name not in config.engine_weights
+    ]
+    for name, weight in sorted(config.engine_weights.items()):
+        if name in rules_by_engine and weight > 0:
+            choices.append(rules_by_engine[name])
+            weights.append(weight)
+    if others and config.other_weight > 0:
+        for name in others:
+            choices.append(rules_by_engine[name])
+            weights.append(config.other_weight / len(others))
+    cumulative = list(itertools.accumulate(weights))
+
+    def pick():
+        rules = choices[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+        return rng.choice(rules)
+
+    return pick
+
+
+def generate_corpus(config=None):
+    """
+    Generate a corpus of referrers.
+
+    :param config: The traffic mix, defaults to :class:`CorpusConfig`'s.
+    :type config:  :class:`CorpusConfig`
+
+    :returns: a ``list`` of ``config.size`` URLs.
+    """
+    if config is None:
+        config = CorpusConfig()
+    rng = random.Random(config.seed)
+    pick = _engine_picker(config, rng)
+
+    distinct = []
+    while len(distinct) < config.distinct:
+        if rng.random() < config.non_serp_share:
+            url = _non_serp_url(rng)
+        else:
+            url = _serp_url(*pick(), rng=rng)
+            if url is None:
+                continue
+        if rng.random() < config.tail_share:
+            url = _add_tail(url, rng.randint(1, config.tail_length), rng)
+        distinct.append(url)
+
+    weights = [1.0 / (rank**config.zipf) for rank in range(1, len(distinct) + 1)]
+    return rng.choices(distinct, weights=weights, k=config.size)
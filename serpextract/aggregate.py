@@ -0,0 +1,306 @@
+"""Count the top keywords of each search engine in a stream of referrers
+using bounded memory.
+
+Counts are kept with the Space-Saving algorithm (Metwally, Agrawal and El
+Abbadi, "Efficient Computation of Frequent and Top-k Elements in Data
+Streams"): at most ``capacity`` keywords are counted per engine and when a new
+keyword comes in, it replaces the keyword with the lowest count and inherits
+that count as its possible overestimate.  Any keyword occurring more than
+``total / capacity`` times is guaranteed to be counted.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import heapq
+import itertools
+
+from six import iteritems
+
+from .serpextract import ExtractResult, extract, extract_many
+
+__all__ = ("KeywordAggregator", "aggregate_windows")
+
+
+class _SpaceSaving(object):
+    """
+    The Space-Saving counters of a single engine.  ``counters`` maps each
+    counted keyword to a ``[count, error]`` list, and ``heap`` holds one
+    ``(count, keyword)`` entry per keyword whose count may be lower than the
+    keyword's current count.
+    """
+
+    __slots__ = ("capacity", "counters", "heap")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counters = {}
+        self.heap = []
+
+    def add(self, keyword, count=1):
+        counters = self.counters
+        counter = counters.get(keyword)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(counters) < self.capacity:
+            counters[keyword] = [count, 0]
+            heapq.heappush(self.heap, (count, keyword))
+            return
+        lowest, evicted = self._pop_lowest()
+        del counters[evicted]
+        counters[keyword] = [lowest + count, lowest]
+        heapq.heappush(self.heap, (lowest + count, keyword))
+
+    def _pop_lowest(self):
+        """
+        Remove and return the heap entry of the keyword with the lowest count,
+        bringing stale entries up to date on the way.
+        """
+        heap = self.heap
+        counters = self.counters
+        while True:
+            count, keyword = heap[0]
+            current = counters[keyword][0]
+            if current == count:
+                return heapq.heappop(heap)
+            heapq.heapreplace(heap, (current, keyword))
+
+    def lowest(self):
+        """
+        Return the count that a keyword which isn't counted may have reached.
+        """
+        if len(self.counters) < self.capacity:
+            return 0
+        count, keyword = self._pop_lowest()
+        heapq.heappush(self.heap, (count, keyword))
+        return count
+
+    def merge(self, other):
+        """
+        Add the counts of another summary to this one.  Keywords missing from
+        either summary are assumed to have that summary's lowest count.
+        """
+        own_lowest = self.lowest()
+        other_lowest = other.lowest()
+        merged = {}
+        for keyword, (count, error) in iteritems(self.counters):
+            other_counter = other.counters.get(keyword, (other_lowest, other_lowest))
+            merged[keyword] = [count + other_counter[0], error + other_counter[1]]
+        for keyword, (count, error) in iteritems(other.counters):
+            if keyword not in merged:
+                merged[keyword] = [count + own_lowest, error + own_lowest]
+        if len(merged) > self.capacity:
+            kept = heapq.nlargest(
+                self.capacity, iteritems(merged), key=lambda item: item[1][0]
+            )
+            merged = dict(kept)
+        self.counters = merged
+        self.heap = [(counter[0], keyword) for keyword, counter in iteritems(merged)]
+        heapq.heapify(self.heap)
+
+    def top(self, n=None):
+        items = iteritems(self.counters)
+        key = lambda item: (-item[1][0], item[0])
+        if n is None:
+            items = sorted(items, key=key)
+        else:
+            items = heapq.nsmallest(n, items, key=key)
+        return [(keyword, count, error) for keyword, (count, error) in items]
+
+
+class KeywordAggregator(object):
+    """
+    Counts the top keywords of each search engine in bounded memory.
+
+    Counts are approximate once more than ``capacity`` distinct keywords have
+    been seen for an engine: every count returned comes with an ``error``,
+    the most it may overestimate the true count by.
+
+    :param capacity: Maximum number of keywords counted per engine.
+    :type capacity:  ``int``
+
+    :param kwargs:   ``lower_case``, ``trimmed``, ``collapse_whitespace`` or
+                     ``use_naive_method``, used to extract keywords from URLs,
+                     see :func:`serpextract.extract`.
+    """
+
+    __slots__ = ("capacity", "extract_kwargs", "engines", "total")
+
+    def __init__(self, capacity=1000, **kwargs):
+        if capacity < 1:
+            raise ValueError("Aggregator capacity must be greater than zero.")
+        self.capacity = capacity
+        self.extract_kwargs = kwargs
+        self.engines = {}
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def add(self, serp_url, count=1):
+        """
+        Count the keyword of a SERP URL.  Non-SERPs are ignored.
+
+        :param serp_url: A suspected SERP URL or the result of extracting one.
+        :type serp_url:  ``str``, :class:`urlparse.ParseResult`,
+                         :class:`serpextract.ExtractResult` or ``None``
+
+        :param count:    Number of times to count the keyword.
+        :type count:     ``int``
+        """
+        if serp_url is not None and not isinstance(serp_url, ExtractResult):
+            serp_url = extract(serp_url, **self.extract_kwargs)
+        if serp_url is not None:
+            self._add_result(serp_url.engine_name, serp_url.keyword, count)
+
+    def _add_result(self, engine_name, keyword, count):
+        summary = self.engines.get(engine_name)
+        if summary is None:
+            summary = self.engines[engine_name] = _SpaceSaving(self.capacity)
+        summary.add(keyword, count)
+        self.total += count
+
+    def update(self, serp_urls, chunksize=1000):
+        """
+        Count the keywords of many SERP URLs.  URLs are extracted in chunks
+        with :func:`serpextract.extract_many`.
+
+        :param serp_urls: Suspected SERP URLs or the results of extracting
+                          them.
+        :type serp_urls:  an iterable of ``str``,
+                          :class:`urlparse.ParseResult`,
+                          :class:`serpextract.ExtractResult` or ``None``
+
+        :param chunksize: Number of URLs to extract at once.
+        :type chunksize:  ``int``
+        """
+        iterator = iter(serp_urls)
+        while True:
+            chunk = list(itertools.islice(iterator, chunksize))
+            if not chunk:
+                return
+            urls = [
+                url
+                for url in chunk
+                if url is not None and not isinstance(url, ExtractResult)
+            ]
+            extracted = iter(extract_many(urls, **self.extract_kwargs))
+            for url in chunk:
+                if url is not None and not isinstance(url, ExtractResult):
+                    url = next(extracted)
+                if url is not None:
+                    self._add_result(url.engine_name, url.keyword, 1)
+
+    def merge(self, other):
+        """
+        Add the counts of another aggregator, e.g. one filled by another
+        process, to this one.
+
+        :param other: The aggregator to merge, which is left unchanged.
+        :type other:  :class:`KeywordAggregator`
+
+        :returns: this aggregator.
+        """
+        for engine_name, other_summary in iteritems(other.engines):
+            summary = self.engines.get(engine_name)
+            if summary is None:
+                summary = self.engines[engine_name] = _SpaceSaving(self.capacity)
+            summary.merge(other_summary)
+        self.total += other.total
+        return self
+
+    def engine_names(self):
+        """
+        :returns: a sorted ``list`` of the names of the engines seen.
+        """
+        return sorted(self.engines)
+
+    def top(self, engine_name, n=10):
+        """
+        Return the most frequent keywords of an engine.
+
+        :param engine_name: Name of the engine.
+        :type engine_name:  ``unicode``
+
+        :param n:           Number of keywords to return, or ``None`` for all
+                            counted keywords.
+        :type n:            ``int``
+
+        :returns: a ``list`` of ``(keyword, count, error)`` tuples, most
+                  frequent first.
+        """
+        summary = self.engines.get(engine_name)
+        if summary is None:
+            return []
+        return summary.top(n)
+
+    def snapshot(self, n=None):
+        """
+        Return the most frequent keywords of every engine.
+
+        :param n: Number of keywords to return per engine, or ``None`` for all
+                  counted keywords.
+        :type n:  ``int``
+
+        :returns: a ``dict`` of engine names to lists of
+                  ``(keyword, count, error)`` tuples, see :meth:`top`.
+        """
+        return {
+            engine_name: summary.top(n)
+            for engine_name, summary in iteritems(self.engines)
+        }
+
+    def clear(self):
+        """
+        Discard all counts.
+        """
+        self.engines = {}
+        self.total = 0
+
+
+def aggregate_windows(records, window, capacity=1000, chunksize=1000, **kwargs):
+    """
+    Count the top keywords of each engine over consecutive time windows.
+
+    Records are expected in time order: a record from before the current
+    window is counted in the current window.
+
+    :param records:   ``(timestamp, serp_url)`` pairs, where ``serp_url`` is
+                      anything accepted by :meth:`KeywordAggregator.add`.
+    :type records:    an iterable of ``tuple``
+
+    :param window:    Length of a window, in the same unit as the timestamps.
+    :type window:     ``int`` or ``float``
+
+    :param capacity:  Maximum number of keywords counted per engine and
+                      window.
+    :type capacity:   ``int``
+
+    :param chunksize: Number of URLs to extract at once, see
+                      :meth:`KeywordAggregator.update`.
+    :type chunksize:  ``int``
+
+    :param kwargs:    Passed on to :class:`KeywordAggregator`.
+
+    :returns: a generator of ``(window_start, aggregator)`` pairs, one per
+              window containing records.
+    """
+    aggregator = None
+    start = None
+    # URLs of the current window which haven't been counted yet
+    pending = []
+    for timestamp, serp_url in records:
+        if start is None or timestamp >= start + window:
+            if aggregator is not None:
+                aggregator.update(pending, chunksize)
+                del pending[:]
+                yield start, aggregator
+            start = timestamp - timestamp % window
+            aggregator = KeywordAggregator(capacity, **kwargs)
+        pending.append(serp_url)
+        if len(pending) >= chunksize:
+            aggregator.update(pending, chunksize)
+            del pending[:]
+    if aggregator is not None:
+        aggregator.update(pending, chunksize)
+        yield start, aggregator
@@ -0,0 +1,156 @@
+"""Extract keywords from whole columns of referrers held in :mod:`pandas` or
+:mod:`pyarrow`.
+
+Every distinct URL in a column is only extracted once (and every distinct
+netloc only looked up once) however many times it occurs, and results are
+returned as columns rather than as an :class:`serpextract.ExtractResult` per
+row.
+
+This module requires :mod:`pandas` and/or :mod:`pyarrow`, which can be
+installed with ``pip install serpextract[frame]``.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from six import string_types
+
+from .serpextract import extract_many
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+    import pyarrow.compute
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+__all__ = ("extract_arrow", "extract_parquet", "extract_series")
+
+
+def _require(module, name):
+    if module is None:
+        raise ImportError(
+            "{} is required for this function, install it with "
+            "'pip install serpextract[frame]'".format(name)
+        )
+
+
+def _extract_unique(urls, kwargs):
+    """
+    Extract the engine names and keywords of distinct URLs.  Anything that
+    isn't a string (e.g. a float ``NaN`` in an ``object`` column) is treated
+    as a non-SERP.
+
+    :returns: a ``tuple`` of two ``list`` of ``unicode`` or ``None``.
+    """
+    engine_names = []
+    keywords = []
+    for result in extract_many(
+        (url if isinstance(url, string_types) else "" for url in urls), **kwargs
+    ):
+        if result is None:
+            engine_names.append(None)
+            keywords.append(None)
+        else:
+            engine_names.append(result.engine_name)
+            keywords.append(result.keyword)
+    return engine_names, keywords
+
+
+def extract_series(series, **kwargs):
+    """
+    Extract the engine names and keywords of a column of SERP URLs.
+
+    :param series: Suspected SERP URLs, missing values are allowed.
+    :type series:  :class:`pandas.Series` of ``str``
+
+    :param kwargs: ``parser``, ``lower_case``, ``trimmed``,
+                   ``collapse_whitespace`` or ``use_naive_method``, see
+                   :func:`serpextract.extract`.
+
+    :returns: a :class:`pandas.DataFrame` with the same index as ``series``
+              and ``engine_name`` and ``keyword`` columns, which are missing
+              for non-SERPs.
+    """
+    _require(pandas, "pandas")
+    codes, uniques = pandas.factorize(series)
+    engine_names, keywords = _extract_unique(uniques, kwargs)
+    # Missing values are coded as -1, which picks the trailing None
+    engine_names.append(None)
+    keywords.append(None)
+    return pandas.DataFrame(
+        {
+            "engine_name": pandas.Series(engine_names, dtype=object).take(codes).values,
+            "keyword": pandas.Series(keywords, dtype=object).take(codes).values,
+        },
+        index=series.index,
+        columns=["engine_name", "keyword"],
+    )
+
+
+def extract_arrow(array, **kwargs):
+    """
+    Extract the engine names and keywords of a column of SERP URLs.
+
+    :param array:  Suspected SERP URLs, nulls are allowed.
+    :type array:   :class:`pyarrow.Array` or :class:`pyarrow.ChunkedArray` of
+                   strings
+
+    :param kwargs: ``parser``, ``lower_case``, ``trimmed``,
+                   ``collapse_whitespace`` or ``use_naive_method``, see
+                   :func:`serpextract.extract`.
+
+    :returns: a :class:`pyarrow.Table` with ``engine_name`` and ``keyword``
+              string columns, which are null for non-SERPs.
+    """
+    _require(pyarrow, "pyarrow")
+    if isinstance(array, pyarrow.ChunkedArray):
+        array = array.combine_chunks()
+    if not pyarrow.types.is_dictionary(array.type):
+        array = pyarrow.compute.dictionary_encode(array)
+    engine_names, keywords = _extract_unique(array.dictionary.to_pylist(), kwargs)
+    # Null indices take null values
+    return pyarrow.table(
+        {
+            "engine_name": pyarrow.array(engine_names, pyarrow.string()).take(
+                array.indices
+            ),
+            "keyword": pyarrow.array(keywords, pyarrow.string()).take(array.indices),
+        }
+    )
+
+
+def extract_parquet(source, destination, column="url", **kwargs):
+    """
+    Read a Parquet file, extract the engine names and keywords of one of its
+    columns and write the table with added ``engine_name`` and ``keyword``
+    columns to another Parquet file.
+
+    :param source:      Path or file object of the Parquet file to read.
+    :type source:       ``str`` or file-like object
+
+    :param destination: Path or file object of the Parquet file to write.
+    :type destination:  ``str`` or file-like object
+
+    :param column:      Name of the column of SERP URLs.
+    :type column:       ``str``
+
+    :param kwargs:      ``parser``, ``lower_case``, ``trimmed``,
+                        ``collapse_whitespace`` or ``use_naive_method``, see
+                        :func:`serpextract.extract`.
+
+    :returns: the :class:`pyarrow.Table` which was written.
+    """
+    _require(pyarrow, "pyarrow")
+    table = pyarrow.parquet.read_table(source)
+    extracted = extract_arrow(table.column(column), **kwargs)
+    for name in extracted.column_names:
+        if name in table.column_names:
+            table = table.drop([name])
+        table = table.append_column(name, extracted.column(name))
+    pyarrow.parquet.write_table(table, destination)
+    return table
@@ -0,0 +1,145 @@
+"""Extract keywords from the referrers of Apache or nginx access logs in the
+combined log format::
+
+    127.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET / HTTP/1.0" 200 2326 "http://www.google.com/search?q=hello" "Mozilla/4.08"
+
+Log files are memory-mapped and the referrer field is found with a single
+regular expression over the whole file, so no string is created for lines
+whose referrer is empty or whose host can't be a search engine.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import itertools
+import mmap
+import re
+
+from .serpextract import _host_might_be_serp, extract_many, get_default_registry
+
+__all__ = ("extract_log", "extract_log_buffer", "iter_referrers")
+
+# The referrer is the quoted field after the quoted request line and the
+# status and size fields.  Quotes within fields are escaped with \, the
+# pattern is unrolled so that runs of plain characters are matched at once
+_referrer_re = re.compile(
+    rb'^[^"\n]*"[^"\\\n]*(?:\\.[^"\\\n]*)*" \d{3} (?:\d+|-) '
+    rb'"([^"\\\n]*(?:\\.[^"\\\n]*)*)"',
+    re.M,
+)
+
+# Byte string version of the last host index's domain labels
+_domain_labels = (None, 0, frozenset())
+
+
+def _get_domain_labels(registry=None):
+    global _domain_labels
+    index = (registry or get_default_registry()).index
+    labels = index.domain_labels
+    cached = _domain_labels
+    if cached[0] is not index or cached[1] != len(labels):
+        encoded = frozenset(label.encode("utf-8") for label in labels)
+        cached = _domain_labels = (index, len(labels), encoded)
+    return cached[2]
+
+
+def _might_be_serp(referrer, domain_labels, use_naive_method):
+    """
+    The equivalent of :func:`serpextract.might_be_serp` for a referrer which
+    hasn't been decoded.
+    """
+    if b"\t" in referrer or b"\r" in referrer:
+        # Let might_be_serp deal with characters which urlparse drops
+        return True
+    if b"cx=partner-pub" in referrer or b"/pemonitorhosted/" in referrer:
+        return True
+    host = referrer.partition(b"//")[2].partition(b"/")[0]
+    host = host.partition(b"?")[0].partition(b"#")[0]
+    return _host_might_be_serp(host, domain_labels, use_naive_method)
+
+
+def iter_referrers(buffer):
+    """
+    Generate the referrers of the lines of a combined format access log.
+    Lines which aren't in the combined log format are skipped.
+
+    :param buffer: Contents of the log.
+    :type buffer:  ``bytes``, :class:`mmap.mmap` or another object supporting
+                   the buffer protocol
+
+    :returns: a generator of ``(offset, referrer)`` pairs, where ``offset``
+              is the position of the start of the line in ``buffer`` and
+              ``referrer`` is ``bytes``, including empty (``b"-"``) referrers.
+    """
+    for match in _referrer_re.finditer(buffer):
+        yield match.start(), match.group(1)
+
+
+def extract_log_buffer(buffer, chunksize=1000, **kwargs):
+    """
+    Extract the keywords of the referrers in the contents of a combined
+    format access log.
+
+    Referrers are only decoded if their host may be a search engine, and are
+    then extracted in chunks with :func:`serpextract.extract_many`.
+
+    :param buffer:    Contents of the log.
+    :type buffer:     ``bytes``, :class:`mmap.mmap` or another object
+                      supporting the buffer protocol
+
+    :param chunksize: Number of referrers to extract at once.
+    :type chunksize:  ``int``
+
+    :param kwargs:    ``lower_case``, ``trimmed``, ``collapse_whitespace``,
+                      ``use_naive_method`` or ``registry``, see
+                      :func:`serpextract.extract`.
+
+    :returns: a generator of ``(offset, engine_name, keyword)`` tuples for
+              each line whose referrer is a SERP, where ``offset`` is the
+              position of the start of the line in ``buffer``.
+    """
+    use_naive_method = kwargs.get("use_naive_method", False)
+    domain_labels = _get_domain_labels(kwargs.get("registry"))
+    candidates = (
+        (offset, referrer)
+        for offset, referrer in iter_referrers(buffer)
+        if referrer != b"-"
+        and _might_be_serp(referrer, domain_labels, use_naive_method)
+    )
+    while True:
+        chunk = list(itertools.islice(candidates, chunksize))
+        if not chunk:
+            return
+        results = extract_many([referrer for _, referrer in chunk], **kwargs)
+        for (offset, _), result in zip(chunk, results):
+            if result is not None:
+                yield offset, result.engine_name, result.keyword
+
+
+def extract_log(filename, chunksize=1000, **kwargs):
+    """
+    Extract the keywords of the referrers in a combined format access log
+    file, which is memory-mapped rather than read.  See
+    :func:`extract_log_buffer` for a description of the other arguments.
+
+    :param filename: Path of the log file.
+    :type filename:  ``str``
+
+    :returns: a generator of ``(offset, engine_name, keyword)`` tuples for
+              each line whose referrer is a SERP, where ``offset`` is the
+              position of the start of the line in the file.
+    """
+    with open(filename, "rb") as log_file:
+        try:
+            buffer = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            return
+        extracted = extract_log_buffer(buffer, chunksize, **kwargs)
+        try:
+            for result in extracted:
+                yield result
+        finally:
+            # Release the scan's reference to the buffer before closing it
+            extracted.close()
+            del extracted
+            buffer.close()
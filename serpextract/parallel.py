@@ -0,0 +1,190 @@
+"""Extract keywords from large numbers of referrers using a pool of worker
+processes."""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import functools
+import gc
+import itertools
+import multiprocessing
+from collections import deque
+
+from six import iteritems
+
+from .serpextract import (
+    ExtractResult,
+    _get_engine_index,
+    extract_many,
+    get_default_registry,
+    set_default_registry,
+)
+
+__all__ = ("extract_iter", "map_chunks")
+
+
+def _chunks(iterable, size):
+    """
+    Split an iterable into lists of at most ``size`` items.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _get_pool(processes, registry=None):
+    """
+    Start a pool of worker processes whose default registry is ``registry``,
+    or the parent's default registry.
+
+    The registry's host index is built in the parent first so that, where
+    processes are forked, the workers share the registry copy-on-write
+    instead of each building their own.  Otherwise the registry is pickled
+    once for each worker, with any custom parsers added to it.
+    """
+    if registry is None:
+        registry = get_default_registry()
+    registry.index  # Built on first access
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+
+    # Move everything allocated so far out of the garbage collector's reach so
+    # that collections in the workers don't touch (and copy) the shared pages
+    freeze = getattr(gc, "freeze", None)
+    if freeze is not None:
+        freeze()
+    try:
+        return context.Pool(processes, initializer=_init_worker, initargs=(registry,))
+    finally:
+        if freeze is not None:
+            gc.unfreeze()
+
+
+def _init_worker(registry):
+    set_default_registry(registry)
+    # A no-op when the registry was inherited from a forked parent
+    _get_engine_index()
+
+
+def map_chunks(
+    func, iterable, processes=None, chunksize=1000, max_pending=None, registry=None
+):
+    """
+    Split ``iterable`` into lists of at most ``chunksize`` items and generate
+    ``func(chunk)`` for each of them, in order, computed in a pool of worker
+    processes.
+
+    Unlike :meth:`multiprocessing.pool.Pool.imap`, ``iterable`` is consumed
+    lazily: at most ``max_pending`` chunks are in flight at any time, so
+    memory use is bounded however long the input is.
+
+    :param func:        A picklable function taking a ``list``.
+    :type func:         ``callable``
+
+    :param iterable:    Items to split into chunks.
+    :type iterable:     iterable
+
+    :param processes:   Number of worker processes, defaults to the number of
+                        CPUs.  With 1, chunks are processed in this process.
+    :type processes:    ``int``
+
+    :param chunksize:   Number of items handed to a worker at a time.
+    :type chunksize:    ``int``
+
+    :param max_pending: Maximum number of chunks in flight, defaults to twice
+                        the number of processes.
+    :type max_pending:  ``int``
+
+    :param registry:    Default registry of the worker processes, defaults to
+                        this process's default registry.
+    :type registry:     :class:`serpextract.EngineRegistry`
+    """
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    chunks = _chunks(iterable, chunksize)
+    if processes <= 1:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+
+    if max_pending is None:
+        max_pending = 2 * processes
+    pool = _get_pool(processes, registry)
+    try:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(func, (chunk,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _extract_chunk(kwargs, registry, serp_urls):
+    """
+    Extract a chunk of URLs with ``registry``, or in a worker with its
+    default registry.  Parsers are returned as a key of the engine table
+    rather than pickled with every result.
+    """
+    if registry is None:
+        registry = get_default_registry()
+    rules = {id(parser): rule for rule, parser in iteritems(registry.engines)}
+    extracted = []
+    for result in extract_many(serp_urls, registry=registry, **kwargs):
+        if result is not None:
+            result = (result.engine_name, result.keyword, rules.get(id(result.parser)))
+        extracted.append(result)
+    return extracted
+
+
+def extract_iter(
+    serp_urls, processes=None, chunksize=1000, max_pending=None, registry=None, **kwargs
+):
+    """
+    Generate :func:`serpextract.extract` results for many URLs, in order,
+    using a pool of worker processes.  See :func:`map_chunks` for a
+    description of ``processes``, ``chunksize`` and ``max_pending``.
+
+    Custom parsers must be added with :func:`serpextract.add_custom_parser`
+    (or to ``registry``) before calling this function for the workers to see
+    them.
+
+    :param serp_urls: Suspected SERP URLs to extract keywords from.
+    :type serp_urls:  an iterable of ``str`` or :class:`urlparse.ParseResult`
+
+    :param registry:  Registry to look the engines up in, defaults to
+                      :func:`serpextract.get_default_registry`.
+    :type registry:   :class:`serpextract.EngineRegistry`
+
+    :param kwargs:    ``lower_case``, ``trimmed``, ``collapse_whitespace`` or
+                      ``use_naive_method``, see :func:`serpextract.extract`.
+
+    :returns: a generator of :class:`serpextract.ExtractResult` or ``None``
+              for each of ``serp_urls``.
+    """
+    if registry is None:
+        registry = get_default_registry()
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    # Workers are handed the registry once when they start rather than with
+    # every chunk
+    func = functools.partial(
+        _extract_chunk, kwargs, registry if processes <= 1 else None
+    )
+    engines = registry.engines
+    chunks = map_chunks(func, serp_urls, processes, chunksize, max_pending, registry)
+    for chunk in chunks:
+        for result in chunk:
+            if result is not None:
+                engine_name, keyword, rule = result
+                result = ExtractResult(engine_name, keyword, engines.get(rule))
+            yield result
@@ -3,24 +3,42 @@ referrers."""
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import codecs
+import csv
+import functools
+import hashlib
+import io
+import itertools
 import logging
+import os
 import re
 import sys
-from collections import defaultdict
+import threading
+import time
+import types
+from array import array
+from collections import OrderedDict, defaultdict, namedtuple
 from io import TextIOWrapper
 
 import pylru
 import tldextract
 from iso3166 import countries
 from six import iteritems, itervalues, PY3, string_types, text_type
-from six.moves.urllib.parse import urlparse, parse_qs, ParseResult
+from six.moves import cPickle as pickle
+from six.moves.urllib.request import pathname2url
+from six.moves.urllib.parse import (
+    urlparse,
+    parse_qs,
+    unquote,
+    unquote_to_bytes,
+    ParseResult,
+)
 
 # import pkg_resources
 # with fallback for environments that lack it
 try:
     import pkg_resources
 except ImportError:
-    import os
 
     class pkg_resources(object):
         """Fake pkg_resources interface which falls back to getting resources
@@ -33,6 +51,13 @@ except ImportError:
             f = os.path.join(moddir, resource_name)
             return open(f)
 
+        @classmethod
+        def resource_string(cls, package, resource_name):
+            moddir = os.path.dirname(__file__)
+            f = os.path.join(moddir, resource_name)
+            with open(f, "rb") as resource:
+                return resource.read()
+
 
 # import ujson for performance with a fallback on default json
 try:
@@ -44,10 +69,39 @@ except ImportError:
 __all__ = (
     "get_parser",
     "is_serp",
+    "might_be_serp",
     "extract",
+    "extract_many",
+    "extract_compact",
+    "extract_columns",
+    "get_engine_id",
+    "get_engine_names",
+    "CompactResult",
     "get_all_query_params",
     "get_all_query_params_by_domain",
+    "get_engine_parsers",
+    "get_engine_domains",
+    "get_query_param_engines",
     "add_custom_parser",
+    "set_suffix_list",
+    "add_keyword_normalizer",
+    "remove_keyword_normalizer",
+    "get_parser_cache_stats",
+    "get_search_engine_stats",
+    "enable_result_cache",
+    "disable_result_cache",
+    "clear_result_cache",
+    "get_result_cache_stats",
+    "enable_stats",
+    "disable_stats",
+    "get_stats",
+    "reset_stats",
+    "set_parser_cache_size",
+    "EngineRegistry",
+    "get_default_registry",
+    "set_default_registry",
+    "reload_search_engines",
+    "SearchEnginesWatcher",
     "SearchEngineParser",
 )
 
@@ -58,15 +112,52 @@ _country_codes = [country.alpha2.lower() for country in countries]
 # domains so we add it to our list see
 # http://en.wikipedia.org/wiki/ISO_3166-1 for more information
 _country_codes += ["uk"]
+_country_code_set = frozenset(_country_codes)
 
 # For generating possible variations of domains based
 _second_level_domains = ["co", "com"]
 
-# Cache for querystring params returned by get_all_query_params_by_domain
-_qs_params = None
+# Second level domains under a country code that are part of a registrable
+# domain (e.g. yahoo.co.jp), used to decide if a match rule is a subdomain
+_registrable_second_level_domains = frozenset(
+    ["ac", "co", "com", "edu", "gen", "go", "gob", "gov", "ne", "net", "or", "org"]
+)
+_registrable_second_level_domain_bytes = frozenset(
+    label.encode("ascii") for label in _registrable_second_level_domains
+)
 
-# A LRUCache of domains to save us from having to do lots of regex matches
-_domain_cache = pylru.lrucache(500)
+# Compiled snapshot of the finished engine table written by
+# update_list.py.  Bump the version whenever the layout of the table or of
+# SearchEngineParser changes so that older snapshots are ignored.
+_snapshot_resource = "search_engines.pickle"
+_snapshot_version = 7
+
+# The default EngineRegistry, see get_default_registry, and the lock held to
+# build or replace it
+_registry = None
+_registry_lock = threading.RLock()
+
+# Number of netlocs that the parser cache of each registry holds, see
+# set_parser_cache_size
+_parser_cache_size = 500
+# Number of hosts whose might_be_serp result each registry remembers; the
+# hosts are forgotten all at once when it's reached
+_host_cache_size = 10000
+
+# Registries expose their engine table through a read-only proxy where the
+# Python version has one
+_read_only = getattr(types, "MappingProxyType", dict)
+
+# An optional _ResultCache of extract() results, see enable_result_cache
+_result_cache = None
+_clock = getattr(time, "monotonic", time.time)
+
+# Optional _Stats of the time spent in each stage of extract(), see
+# enable_stats
+_stats = None
+_perf_clock = getattr(time, "perf_counter", _clock)
+# Engines whose parser special-cases the query string, timed apart
+_google_engines = frozenset(["Google", "Google Images"])
 
 # Naive search engine detection.  Look for \.?search\. in the netloc and then
 # try to extract using common query params
@@ -78,6 +169,34 @@ _naive_params = (
     "keyword",
     "term",
 )
+_naive_param_set = frozenset(_naive_params)
+
+# Enumeration of engine names for compact results: a list of names indexed
+# by ID, with 0 standing for no engine, and a dict of names to IDs.  Results
+# of naive detection all share one ID, named after _naive_engine_name, since
+# numbering every domain they come from would never stop
+_engine_names = None
+_engine_ids = None
+_naive_engine_name = "(naive)"
+_intern = getattr(sys, "intern", lambda string: string)
+
+# Offline extractor of registrable domains, see set_suffix_list, and a LRU
+# cache of its results per host
+_suffix_list = None
+_tld_extractor = None
+_tld_cache = None  # A _LRUCache, set once the class is defined
+
+# Keyword normalization.  A run of whitespace which isn't already a single
+# space is collapsed into one, so that normalized keywords aren't rewritten.
+_whitespace_re = re.compile(r"\s{2,}|[^\S ]", re.UNICODE)
+# Functions added by add_keyword_normalizer, run after the built-in steps
+_keyword_normalizers = []
+# Cache of the steps to run for each combination of options
+_normalization_steps = {}
+
+# Query string params that SearchEngineParser.parse reads for Google besides
+# the keyword extractors
+_google_params = frozenset(["tbm", "prev", "as_q", "as_oq", "as_epq", "as_eq"])
 
 
 def _unicode_parse_qs(qs, **kwargs):
@@ -108,6 +227,139 @@ def _unicode_parse_qs(qs, **kwargs):
     return unicode_query
 
 
+def _scan_query(qs, keys, keep_blank_values=False, charsets=()):
+    """
+    Parse only the given keys out of a query string.  Equivalent to
+    ``_unicode_parse_qs(qs, keep_blank_values=keep_blank_values)`` restricted
+    to ``keys``, but values of any other key are never decoded.
+
+    :param qs:                Percent-encoded query string to be parsed.
+    :type qs:                 ``str``
+
+    :param keys:              The keys to return values for.
+    :type keys:               ``set`` or ``frozenset``
+
+    :param keep_blank_values: Whether to return blank values.
+    :type keep_blank_values:  ``True`` or ``False``
+
+    :param charsets:          Charsets to try when decoding values, see
+                              :func:`_decode_query_value`.
+    :type charsets:           ``list``
+
+    :returns: a ``dict`` mapping each key found to a ``list`` of its values.
+    """
+    if not PY3:
+        query = _unicode_parse_qs(qs, keep_blank_values=keep_blank_values)
+        return {key: values for key, values in iteritems(query) if key in keys}
+
+    found = {}
+    for field in qs.split("&"):
+        name, sep, value = field.partition("=")
+        if not sep:
+            if not field or not keep_blank_values:
+                continue
+        elif not value and not keep_blank_values:
+            continue
+        if "%" in name or "+" in name:
+            name = unquote(name.replace("+", " "), errors="replace")
+        if name not in keys:
+            continue
+        value = _decode_query_value(value, charsets)
+        if name in found:
+            found[name].append(value)
+        else:
+            found[name] = [value]
+    return found
+
+
+def _query_has_key(qs, keys, keep_blank_values=False):
+    """
+    Determine if a query string has any of the given keys, i.e. if
+    ``_scan_query(qs, keys, keep_blank_values)`` would find any, without
+    decoding values.
+
+    :param qs:                Percent-encoded query string.
+    :type qs:                 ``str``
+
+    :param keys:              The keys to look for.
+    :type keys:               ``set`` or ``frozenset``
+
+    :param keep_blank_values: Whether keys with blank values count.
+    :type keep_blank_values:  ``True`` or ``False``
+
+    :returns: ``True`` or ``False``.
+    """
+    if not PY3:
+        return bool(_scan_query(qs, keys, keep_blank_values=keep_blank_values))
+
+    for field in qs.split("&"):
+        name, sep, value = field.partition("=")
+        if not sep:
+            if not field or not keep_blank_values:
+                continue
+        elif not value and not keep_blank_values:
+            continue
+        if "%" in name or "+" in name:
+            name = unquote(name.replace("+", " "), errors="replace")
+        if name in keys:
+            return True
+    return False
+
+
+# Decode functions for the charsets used by search engines, so that codecs
+# are only looked up once
+_decoders = {}
+
+
+def _get_decoder(charset):
+    """
+    Return the ``codecs`` decode function for a charset, or ``None`` if the
+    charset is unknown.
+    """
+    try:
+        return _decoders[charset]
+    except KeyError:
+        try:
+            decoder = codecs.getdecoder(charset)
+        except LookupError:
+            log.debug("Unknown charset %r", charset)
+            decoder = None
+        _decoders[charset] = decoder
+        return decoder
+
+
+def _decode_query_value(value, charsets=()):
+    """
+    Percent-decode a query string value to bytes and decode those with the
+    first charset that can: UTF-8, then each of ``charsets`` in order.  If
+    none of them can, invalid UTF-8 sequences are replaced.
+
+    :param value:    A percent-encoded query string value.
+    :type value:     ``str``
+
+    :param charsets: Charsets the search engine may use for keywords.
+    :type charsets:  ``list``
+    """
+    if "+" in value:
+        value = value.replace("+", " ")
+    if "%" not in value:
+        return value
+
+    raw = unquote_to_bytes(value)
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+    for charset in charsets:
+        decoder = _get_decoder(charset)
+        if decoder is not None:
+            try:
+                return decoder(raw)[0]
+            except UnicodeDecodeError:
+                continue
+    return raw.decode("utf-8", "replace")
+
+
 def _unicode_urlparse(url, encoding="utf-8", errors="ignore"):
     """
     Safely parse a URL into a :class:`urlparse.ParseResult` ensuring that
@@ -124,15 +376,25 @@ def _unicode_urlparse(url, encoding="utf-8", errors="ignore"):
                      unicode given encoding (default is ignore).
     :type errors:    ``bytes``
     """
-    if isinstance(url, bytes):
-        url = url.decode(encoding, errors)
-    elif isinstance(url, ParseResult):
-        # Ensure every part is unicode because we can't rely on clients to do so
-        parts = list(url)
-        for i in range(len(parts)):
-            if isinstance(parts[i], bytes):
-                parts[i] = parts[i].decode(encoding, errors)
-        return ParseResult(*parts)
+    if not isinstance(url, text_type):
+        if isinstance(url, bytes):
+            url = url.decode(encoding, errors)
+        elif isinstance(url, ParseResult):
+            # Ensure every part is unicode because we can't rely on clients to
+            # do so
+            if not any(isinstance(part, bytes) for part in url):
+                return url
+            parts = list(url)
+            for i in range(len(parts)):
+                if isinstance(parts[i], bytes):
+                    parts[i] = parts[i].decode(encoding, errors)
+            return ParseResult(*parts)
+        else:
+            raise TypeError(
+                "URL must be a string or a ParseResult, not {}.".format(
+                    type(url).__name__
+                )
+            )
 
     try:
         return urlparse(url)
@@ -172,26 +434,55 @@ def _is_url_without_path_query_or_fragment(url_parts):
     )
 
 
-_engines = None
+def _get_search_engines():
+    """
+    Return the engine table of the default :class:`EngineRegistry`, a
+    read-only mapping of match rules to :class:`SearchEngineParser` objects.
+    """
+    return get_default_registry().engines
 
 
-def _get_search_engines():
+def _build_search_engines(matomo_engines):
     """
-    Convert the OrderedDict of search engine parsers that we get from Matomo
-    to a dictionary of SearchEngineParser objects.
+    Build the dictionary of SearchEngineParser objects keyed by domain from
+    Matomo's search engine definitions.
+
+    Templated domains such as ``google.{}`` are kept as a single key rather
+    than being expanded over every country code; :class:`_HostIndex`
+    resolves them at lookup time.  Domains with identical definitions share
+    a single :class:`SearchEngineParser`.
 
-    Cache this thing by storing in the global ``_engines``.
+    :param matomo_engines: Search engine definitions as returned by
+                           :func:`_get_matomo_engines`.
+    :type matomo_engines:  ``dict``
     """
-    global _engines
-    if _engines:
-        return _engines
+    engines = {}
+    parsers = {}
 
-    matomo_engines = _get_matomo_engines()
+    for domain, definition in _iter_rule_definitions(matomo_engines):
+        key = tuple(_hashable(value) for value in definition)
+        parser = parsers.get(key)
+        if parser is None:
+            parser = parsers[key] = SearchEngineParser(*definition)
+        engines[domain] = parser
+
+    return engines
+
+
+def _iter_rule_definitions(matomo_engines):
+    """
+    Generate the effective definition of every domain in Matomo's search
+    engine definitions, in order, as ``(domain, definition)`` pairs where
+    ``definition`` is the tuple of :class:`SearchEngineParser` arguments.
+    A domain appearing more than once takes its last definition.
+
+    :param matomo_engines: Search engine definitions as returned by
+                           :func:`_get_matomo_engines`.
+    :type matomo_engines:  ``dict``
+    """
     # Engine names are the first param of each of the search engine arrays
     # so we group by those guys, and create our new dictionary with that
     # order
-    _engines = {}
-
     for engine_name, rule_group in iteritems(matomo_engines):
         defaults = {
             "extractor": None,
@@ -201,8 +492,6 @@ def _get_search_engines():
         }
 
         for rule in rule_group:
-            if any(url for url in rule["urls"] if "{}" in url):
-                rule["urls"] = _expand_country_codes(rule["urls"])
             for i, domain in enumerate(rule["urls"]):
                 if i == 0:
                     defaults["extractor"] = rule["params"]
@@ -213,7 +502,7 @@ def _get_search_engines():
                     if "hiddenkeyword" in rule:
                         defaults["hiddenkeyword"] = rule["hiddenkeyword"]
 
-                _engines[domain] = SearchEngineParser(
+                yield domain, (
                     engine_name,
                     defaults["extractor"],
                     defaults["link_macro"],
@@ -221,7 +510,527 @@ def _get_search_engines():
                     defaults["hiddenkeyword"],
                 )
 
-    return _engines
+
+def _hashable(value):
+    """
+    Return a hashable equivalent of a value from Matomo's definitions, which
+    are either strings or lists of strings.
+    """
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _definitions_digest(definitions):
+    """
+    Return the digest used to tie a compiled snapshot to the exact
+    ``search_engines.json`` it was built from.
+
+    :param definitions: Raw contents of ``search_engines.json``.
+    :type definitions:  ``bytes``
+    """
+    return hashlib.sha1(definitions).hexdigest()
+
+
+def _load_snapshot(digest):
+    """
+    Load the compiled engine table snapshot, a ``dict`` with the engine
+    table under ``engines`` and its pickled :class:`_EngineMetadata` under
+    ``metadata``.  Returns ``None`` when the snapshot is missing, unreadable,
+    or was built from different definitions or by a different version of this
+    module.
+
+    The snapshot file holds two pickles: a small header with the ``version``
+    and ``digest`` it was built with, then the rest.  The rest is only
+    unpickled once the header has been checked.
+
+    :param digest: Digest of the current ``search_engines.json``.
+    :type digest:  ``str``
+    """
+    try:
+        snapshot_file = pkg_resources.resource_stream(__name__, _snapshot_resource)
+    except Exception:
+        log.debug("Could not load engine snapshot", exc_info=True)
+        return None
+
+    with snapshot_file:
+        try:
+            header = pickle.load(snapshot_file)
+            if (
+                not isinstance(header, dict)
+                or header.get("version") != _snapshot_version
+                or header.get("digest") != digest
+            ):
+                log.debug("Ignoring stale engine snapshot")
+                return None
+            snapshot = pickle.load(snapshot_file)
+        except Exception:
+            log.debug("Could not load engine snapshot", exc_info=True)
+            return None
+
+    snapshot.update(header)
+    return snapshot
+
+
+def _compile_snapshot(filename=None):
+    """
+    Build the engine table from ``search_engines.json`` and save it as a
+    compiled snapshot which :meth:`EngineRegistry.load` can load without
+    parsing and expanding the JSON definitions.
+
+    :param filename: Where to write the snapshot (defaults to
+                     ``search_engines.pickle`` inside this package).
+    :type filename:  ``str``
+
+    :returns: the path the snapshot was written to.
+    """
+    if filename is None:
+        filename = os.path.join(os.path.dirname(__file__), _snapshot_resource)
+
+    definitions = pkg_resources.resource_string(__name__, "search_engines.json")
+    engines = _build_search_engines(_get_matomo_engines(definitions))
+    header = {"version": _snapshot_version, "digest": _definitions_digest(definitions)}
+    snapshot = {
+        "engines": engines,
+        # Only unpickled when the metadata is first used
+        "metadata": pickle.dumps(_EngineMetadata(engines), protocol=2),
+    }
+    with open(filename, "wb") as snapshot_file:
+        pickle.dump(header, snapshot_file, protocol=2)
+        pickle.dump(snapshot, snapshot_file, protocol=2)
+    return filename
+
+
+class _HostIndexNode(object):
+    __slots__ = ("children", "key", "paths", "subdomains")
+
+    def __init__(self):
+        self.children = {}
+        self.key = None
+        self.paths = []
+        self.subdomains = False
+
+
+class _HostIndex(object):
+    """
+    Index of the match rules in the engine table keyed on reversed host
+    labels, so ``www.google.co.uk`` is found by walking ``uk``, ``co``,
+    ``google``.  Match rules with a path (e.g. ``google.{}/cse``) hang off
+    their host node as path prefixes.
+
+    A ``{}`` label in a match rule matches any country code, and a trailing
+    ``{}`` without a path also matches ``co.<cc>`` and ``com.<cc>``, the same
+    domains :func:`_expand_country_codes` would generate.  Besides exact
+    matches, a rule also matches its host prefixed with ``www.`` and, when the
+    rule's host is itself a subdomain (e.g. ``search.yahoo.com``) and the rule
+    has no path, any subdomain of it.
+
+    The index only stores match rules; parsers are always looked up in the
+    engine table itself.  It also keeps the set of labels that make up the
+    registrable domains of all the rules (``google``, ``yahoo``, ...) which
+    :func:`might_be_serp` uses to quickly rule out other hosts, and the
+    answer for the hosts it was last asked about.
+    """
+
+    __slots__ = ("root", "domain_labels", "hosts")
+
+    def __init__(self, match_rules=()):
+        self.root = _HostIndexNode()
+        self.domain_labels = set()
+        # Hosts to the result of _host_might_be_serp for them
+        self.hosts = {}
+        for match_rule in match_rules:
+            self.add(match_rule)
+
+    def add(self, match_rule):
+        """
+        Add a match rule to the index.
+
+        :param match_rule: A key of the engine table, e.g. ``'google.{}'``.
+        :type match_rule:  ``unicode``
+        """
+        host, sep, path = match_rule.partition("/")
+        labels = host.split(".")[::-1]
+        variants = [labels]
+        if labels[0] == "{}" and not path:
+            variants += [
+                labels[:1] + [second_level_domain] + labels[1:]
+                for second_level_domain in _second_level_domains
+            ]
+
+        self.hosts.clear()
+        domain_label = _registrable_label(host)
+        if domain_label == "{}":
+            self.domain_labels.update(_country_codes)
+        else:
+            self.domain_labels.add(domain_label)
+
+        subdomains = _is_subdomain(host)
+        for variant in variants:
+            node = self.root
+            for label in variant:
+                node = node.children.setdefault(label, _HostIndexNode())
+            if path:
+                node.paths.append((sep + path, match_rule))
+                node.paths.sort(key=lambda p: len(p[0]), reverse=True)
+            else:
+                node.key = match_rule
+                node.subdomains = subdomains
+
+    def lookup(self, host):
+        """
+        Find the nodes matching ``host``, most specific first.  The result
+        only depends on the host so it can be cached and passed to
+        :meth:`resolve` for any path on that host.
+
+        :param host: A netloc, e.g. ``'www.google.co.uk'``.
+        :type host:  ``unicode``
+
+        :returns: a ``tuple`` of ``(is_subdomain_match, paths, match_rule)``
+                  tuples, where ``paths`` are the ``(prefix, match_rule)``
+                  pairs of a node matching the host with or without
+                  ``www.`` and ``match_rule`` is the node's rule without a
+                  path.
+        """
+        labels = host.split(".")
+        www = labels[0] == "www"
+        found = []
+        stack = [(self.root, len(labels))]
+        while stack:
+            node, remaining = stack.pop()
+            if remaining == 0 or (remaining == 1 and www):
+                if node.key is not None or node.paths:
+                    found.append((False, remaining, len(found), node.paths, node.key))
+            elif node.subdomains:
+                found.append((True, remaining, len(found), (), node.key))
+            if remaining:
+                remaining -= 1
+                label = labels[remaining]
+                children = node.children
+                if label in _country_code_set and "{}" in children:
+                    stack.append((children["{}"], remaining))
+                # Pushed last so that exact labels are visited first
+                if label in children:
+                    stack.append((children[label], remaining))
+
+        if len(found) > 1:
+            found.sort(key=lambda f: f[:3])
+        return tuple((f[0], f[3], f[4]) for f in found)
+
+    @staticmethod
+    def resolve(engines, candidates, path="", fallback=None):
+        """
+        Pick the parser for a path from the nodes found by :meth:`lookup`.
+
+        :param engines:    The engine table of an :class:`EngineRegistry`.
+        :type engines:     ``dict``
+
+        :param candidates: Result of :meth:`lookup` for the URL's netloc.
+        :type candidates:  ``tuple``
+
+        :param path:       The URL path.
+        :type path:        ``unicode``
+
+        :param fallback:   An optional match rule to use if no rule matches the
+                           host itself, before trying rules that match it as a
+                           subdomain.
+        :type fallback:    ``unicode``
+
+        :returns: :class:`SearchEngineParser` or ``None``.
+        """
+        for subdomain, paths, key in candidates:
+            if subdomain and fallback is not None:
+                break
+            for prefix, match_rule in paths:
+                if _is_path_prefix(prefix, path):
+                    parser = engines.get(match_rule)
+                    if parser is not None:
+                        return parser
+            if key is not None:
+                parser = engines.get(key)
+                if parser is not None:
+                    return parser
+        else:
+            if fallback is None:
+                return None
+
+        return engines.get(fallback)
+
+    @staticmethod
+    def resolve_all(engines, candidates, path="", fallback=None):
+        """
+        Generate every parser matching a path from the nodes found by
+        :meth:`lookup`, in the order :meth:`resolve` tries them, so the first
+        one is the parser :meth:`resolve` returns.  See :meth:`resolve` for a
+        description of the arguments.
+        """
+        for subdomain, paths, key in candidates:
+            if subdomain and fallback is not None:
+                break
+            for prefix, match_rule in paths:
+                if _is_path_prefix(prefix, path):
+                    parser = engines.get(match_rule)
+                    if parser is not None:
+                        yield parser
+            if key is not None:
+                parser = engines.get(key)
+                if parser is not None:
+                    yield parser
+
+        if fallback is not None:
+            parser = engines.get(fallback)
+            if parser is not None:
+                yield parser
+
+    def match(self, engines, host, path="", fallback=None):
+        """
+        Find the most specific parser for a host and path.  See
+        :meth:`resolve` for a description of the arguments.
+        """
+        return self.resolve(engines, self.lookup(host), path, fallback)
+
+
+def _registrable_labels(host):
+    """
+    Split a host (which may contain ``{}`` country code templates) into its
+    labels, ignoring a leading ``www.``, and guess how many of those labels
+    make up its registrable domain.
+
+    :returns: a ``(labels, num_registrable_labels)`` tuple.
+    """
+    labels = host.split(".")
+    if labels[0] == "www" and len(labels) > 1:
+        labels = labels[1:]
+    registrable = 2
+    if (
+        len(labels) > 2
+        and labels[-2] in _registrable_second_level_domains
+        and (labels[-1] == "{}" or labels[-1] in _country_code_set)
+    ):
+        registrable = 3
+    return labels, registrable
+
+
+def _registrable_label(host):
+    """
+    Return the label of a host that names its registrable domain, e.g.
+    ``'yahoo'`` for ``'search.yahoo.co.jp'``.
+
+    :param host: A host, e.g. ``'search.yahoo.com'``.
+    :type host:  ``unicode``
+    """
+    labels, registrable = _registrable_labels(host)
+    return labels[-min(registrable, len(labels))]
+
+
+def _is_subdomain(host):
+    """
+    Determines if a host (which may contain ``{}`` country code templates) has
+    more labels than its registrable domain, ignoring a leading ``www.``.
+
+    :param host: A host, e.g. ``'search.yahoo.com'``.
+    :type host:  ``unicode``
+    """
+    labels, registrable = _registrable_labels(host)
+    return len(labels) > registrable
+
+
+def _is_path_prefix(prefix, path):
+    """
+    Determines if ``prefix`` is a prefix of ``path`` ending on a path segment
+    boundary.
+    """
+    if not path.startswith(prefix):
+        return False
+    return len(path) == len(prefix) or prefix.endswith("/") or path[len(prefix)] == "/"
+
+
+def _get_engine_index():
+    """
+    Return the :class:`_HostIndex` of the default :class:`EngineRegistry`.
+    """
+    return get_default_registry().index
+
+
+def _get_tld_extractor():
+    """
+    Return the :class:`tldextract.TLDExtract` used to find registrable
+    domains.  It never fetches the public suffix list over the network: it
+    uses the list bundled with tldextract, or the file configured with
+    :func:`set_suffix_list`, and doesn't write a cache to disk.
+
+    Cache this thing by storing in the global ``_tld_extractor``.
+    """
+    global _tld_extractor
+    if _tld_extractor is None:
+        if _suffix_list is None:
+            _tld_extractor = tldextract.TLDExtract(
+                suffix_list_urls=(), cache_dir=None, fallback_to_snapshot=True
+            )
+        else:
+            url = "file://" + pathname2url(os.path.abspath(_suffix_list))
+            _tld_extractor = tldextract.TLDExtract(
+                suffix_list_urls=(url,), cache_dir=None, fallback_to_snapshot=False
+            )
+    return _tld_extractor
+
+
+def _tld_extract(host):
+    """
+    Split a host into its subdomain, domain and suffix with
+    :func:`_get_tld_extractor`, caching the result.
+    """
+    result = _tld_cache.get(host)
+    if result is None:
+        result = _get_tld_extractor()(host)
+        _tld_cache.put(host, result)
+    return result
+
+
+def set_suffix_list(filename=None):
+    """
+    Use a public suffix list file (in the format of
+    https://publicsuffix.org/list/public_suffix_list.dat) to find registrable
+    domains, instead of the list bundled with tldextract.  The suffix list is
+    never fetched over the network.  The index of
+    :func:`get_all_query_params_by_domain` of every :class:`EngineRegistry`
+    is rebuilt with the new list on its next use.
+
+    :param filename: Path of the suffix list, or ``None`` to go back to the
+                     bundled list.
+    :type filename:  ``str``
+    """
+    global _suffix_list, _tld_extractor
+    with _registry_lock:
+        _tld_extractor = None
+        _tld_cache.clear()
+        # Registries compare the list their metadata was built with to this
+        _suffix_list = filename
+        # Naive results are cached
+        clear_result_cache()
+
+
+def _query_params(parser):
+    """
+    Return the query string params (as opposed to path regexes) that a
+    parser extracts keywords from.
+    """
+    return {
+        param for param in parser.keyword_extractor if isinstance(param, string_types)
+    }
+
+
+def _registrable_domains(match_rule):
+    """
+    Return the registrable domains that a match rule, e.g. ``google.{}``,
+    covers.
+    """
+    domains = _expand_country_codes(match_rule) if "{}" in match_rule else [match_rule]
+    extractor = _get_tld_extractor()
+    return {_registered_domain(extractor(domain)) for domain in domains}
+
+
+def _registered_domain(tld_res):
+    """
+    Return the registrable domain of a :func:`tldextract.extract` result, or
+    ``''`` if it has none.  Equivalent to its ``registered_domain``, which
+    recent versions of tldextract deprecate.
+    """
+    if tld_res.domain and tld_res.suffix:
+        return tld_res.domain + "." + tld_res.suffix
+    return ""
+
+
+class _EngineMetadata(object):
+    """
+    Reverse indexes over the match rules of the engine table, by engine name,
+    by registrable domain and by query string param.  Only match rules are
+    stored so that the indexes don't depend on the parser objects, which are
+    looked up in the engine table.
+
+    The indexes map to ``frozenset`` so that copies made by :meth:`copy` can
+    share them.
+    """
+
+    __slots__ = ("rules_by_name", "rules_by_domain", "rules_by_param", "params")
+
+    def __init__(self, engines=None):
+        self.rules_by_name = {}
+        self.rules_by_domain = {}
+        self.rules_by_param = {}
+        # Cache of the params by domain derived from rules_by_domain
+        self.params = None
+        if engines:
+            for match_rule, parser in iteritems(engines):
+                self.add(match_rule, parser)
+
+    def copy(self):
+        """
+        Return a copy of the indexes which can be added to without changing
+        these ones.
+        """
+        metadata = _EngineMetadata()
+        metadata.rules_by_name = dict(self.rules_by_name)
+        metadata.rules_by_domain = dict(self.rules_by_domain)
+        metadata.rules_by_param = dict(self.rules_by_param)
+        return metadata
+
+    def add(self, match_rule, parser, replaced=None):
+        """
+        Add a match rule to the indexes.
+
+        :param match_rule: A key of the engine table, e.g. ``'google.{}'``.
+        :type match_rule:  ``unicode``
+
+        :param parser:     The parser of the match rule.
+        :type parser:      :class:`SearchEngineParser`
+
+        :param replaced:   The parser that the match rule previously had, if
+                           any.
+        :type replaced:    :class:`SearchEngineParser`
+        """
+        rule = frozenset([match_rule])
+        if replaced is not None:
+            _update_index(self.rules_by_name, [replaced.engine_name], rule, True)
+            _update_index(self.rules_by_param, _query_params(replaced), rule, True)
+        _update_index(self.rules_by_name, [parser.engine_name], rule)
+        _update_index(self.rules_by_param, _query_params(parser), rule)
+        _update_index(self.rules_by_domain, _registrable_domains(match_rule), rule)
+        self.params = None
+
+    def params_by_domain(self, engines):
+        """
+        Return the query string params of every registrable domain.
+        """
+        params = self.params
+        if params is None:
+            params = defaultdict(list)
+            for domain, rules in iteritems(self.rules_by_domain):
+                domain_params = set()
+                for match_rule in rules:
+                    parser = engines.get(match_rule)
+                    if parser is not None:
+                        domain_params |= _query_params(parser)
+                params[domain] = sorted(domain_params)
+            self.params = params
+        return params
+
+    def __getstate__(self):
+        return (self.rules_by_name, self.rules_by_domain, self.rules_by_param)
+
+    def __setstate__(self, state):
+        self.rules_by_name, self.rules_by_domain, self.rules_by_param = state
+        self.params = None
+
+
+def _update_index(index, keys, rules, remove=False):
+    """
+    Add ``rules`` to (or remove them from) the ``frozenset`` of each of
+    ``keys`` in one of the indexes of :class:`_EngineMetadata`.
+    """
+    for key in keys:
+        current = index.get(key, frozenset())
+        index[key] = current - rules if remove else current | rules
 
 
 def _expand_country_codes(urls):
@@ -241,11 +1050,18 @@ def _expand_country_codes(urls):
     return expanded_urls
 
 
-def _get_matomo_engines():
+def _get_matomo_engines(definitions=None):
     """
     Return the search engine parser definitions stored in this module. We don't
     cache this result since it's only supposed to be called once.
+
+    :param definitions: Raw contents of ``search_engines.json`` if they have
+                        already been read.
+    :type definitions:  ``bytes``
     """
+    if definitions is not None:
+        return json.loads(definitions.decode("utf-8"))
+
     stream = pkg_resources.resource_stream
     with stream(__name__, "search_engines.json") as json_stream:
         if PY3:
@@ -270,6 +1086,245 @@ class ExtractResult(object):
         return repr_fmt.format(self.engine_name, self.keyword, self.parser)
 
 
+class CompactResult(namedtuple("CompactResult", ("engine_id", "keyword"))):
+    """
+    A compact alternative to :class:`ExtractResult` returned by
+    :func:`extract_compact`, an immutable ``(engine_id, keyword)`` tuple.
+    The engine's name is found with :func:`get_engine_names`; results of
+    naive detection don't keep the domain they were found on.
+    """
+
+    __slots__ = ()
+
+    @property
+    def engine_name(self):
+        if _engine_names is None:
+            # Built or unpickled before any engine was numbered
+            _get_engine_ids()
+        return _engine_names[self.engine_id]
+
+
+class _LRUCache(object):
+    """
+    An approximately least recently used cache which counts its hits, misses
+    and evictions, made to be shared between threads.
+
+    Entries are kept in two generations.  New entries go to the young one,
+    a plain ``dict`` which is read without taking a lock, so that hits don't
+    make threads wait for each other.  Once the cache is full, the young
+    generation becomes the old one and entries are evicted from the old
+    generation in the order they were added, unless a hit moves them back to
+    the young one first.  Hits on the young generation are counted without
+    a lock, so the number of hits may be slightly off when threads race.
+    """
+
+    __slots__ = ("young", "old", "capacity", "lock", "hits", "stats")
+
+    # Returned by dict.get for keys which aren't cached
+    _missing = object()
+
+    def __init__(self, size):
+        self.young = {}
+        self.old = OrderedDict()
+        self.capacity = size
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stats = {"misses": 0, "evictions": 0}
+
+    def __len__(self):
+        return len(self.young) + len(self.old)
+
+    def get(self, key, default=None):
+        value = self.young.get(key, self._missing)
+        if value is not self._missing:
+            self.hits += 1
+            return value
+
+        with self.lock:
+            value = self.old.pop(key, self._missing)
+            if value is self._missing:
+                # Put in the young generation by another thread meanwhile
+                value = self.young.get(key, self._missing)
+                if value is self._missing:
+                    self.stats["misses"] += 1
+                    return default
+            else:
+                self.young[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            young = self.young
+            if key not in young:
+                self.old.pop(key, None)
+                self._evict(self.capacity - 1)
+                young = self.young
+            young[key] = value
+
+    def _evict(self, capacity):
+        """
+        Evict the oldest entries until at most ``capacity`` are left, with
+        the lock held.
+        """
+        old = self.old
+        while len(self.young) + len(old) > capacity:
+            if not old:
+                # Replaced rather than emptied, as it may be read meanwhile
+                old = self.old = OrderedDict(self.young)
+                self.young = {}
+            old.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self.lock:
+            self.young = {}
+            self.old = OrderedDict()
+
+    def size(self, size=None):
+        with self.lock:
+            if size is not None:
+                self.capacity = size
+                self._evict(size)
+            return self.capacity
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["hits"] = self.hits
+            stats["size"] = self.capacity
+            stats["length"] = len(self)
+        return stats
+
+
+_tld_cache = _LRUCache(1000)
+
+
+class _ResultCache(object):
+    """
+    A LRU cache of :func:`extract` results keyed on the URL and the
+    normalization options, where entries optionally expire ``ttl`` seconds
+    after being cached.
+
+    Results are stored as tuples and a new :class:`ExtractResult` is returned
+    for every hit so that callers modifying a result can't modify the cache.
+    """
+
+    __slots__ = ("entries", "lock", "ttl", "stats")
+
+    # Returned by get for keys which aren't cached, since None is a valid
+    # cached result
+    missing = object()
+
+    def __init__(self, size, ttl=None):
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self.entries = pylru.lrucache(size, self._count_eviction)
+        self.lock = threading.Lock()
+        self.ttl = ttl
+
+    def _count_eviction(self, key, value):
+        self.stats["evictions"] += 1
+
+    def get(self, key):
+        with self.lock:
+            try:
+                expires, result = self.entries[key]
+            except KeyError:
+                self.stats["misses"] += 1
+                return self.missing
+            if expires is not None and expires <= _clock():
+                del self.entries[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return self.missing
+            self.stats["hits"] += 1
+        if result is not None:
+            result = ExtractResult(*result)
+        return result
+
+    def put(self, key, result):
+        expires = None if self.ttl is None else _clock() + self.ttl
+        if result is not None:
+            result = (result.engine_name, result.keyword, result.parser)
+        with self.lock:
+            self.entries[key] = (expires, result)
+
+    def emptied(self):
+        """
+        Return an empty cache of the same size and TTL which carries on
+        counting statistics where this one left off.
+        """
+        cache = _ResultCache(self.entries.size(), self.ttl)
+        with self.lock:
+            cache.stats.update(self.stats)
+        return cache
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["size"] = self.entries.size()
+            stats["length"] = len(self.entries)
+        stats["ttl"] = self.ttl
+        return stats
+
+
+# Outcomes of extract() counted by _Stats: a keyword found by a parser or by
+# the naive method, a URL which isn't a SERP and a URL which can't be parsed
+_stats_outcomes = ("serp", "naive", "not_serp", "malformed")
+
+
+class _Stats(object):
+    """
+    Cumulative timings of the stages of :func:`extract` and counts of its
+    outcomes, see :func:`enable_stats`.
+    """
+
+    __slots__ = ("lock", "callback", "stages", "outcomes", "engines")
+
+    def __init__(self, callback=None):
+        self.lock = threading.Lock()
+        self.callback = callback
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # Stage names to [calls, seconds]
+            self.stages = {}
+            self.outcomes = dict.fromkeys(_stats_outcomes, 0)
+            self.engines = defaultdict(int)
+
+    def record(self, timings, outcome, engine_name):
+        with self.lock:
+            stages = self.stages
+            for stage, seconds in iteritems(timings):
+                totals = stages.get(stage)
+                if totals is None:
+                    stages[stage] = [1, seconds]
+                else:
+                    totals[0] += 1
+                    totals[1] += seconds
+            self.outcomes[outcome] += 1
+            if engine_name is not None:
+                self.engines[engine_name] += 1
+        callback = self.callback
+        if callback is not None:
+            try:
+                callback(timings, outcome, engine_name)
+            except Exception:
+                log.warning("Stats callback %r failed", callback, exc_info=True)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.outcomes)
+            stats["urls"] = sum(itervalues(self.outcomes))
+            stats["engines"] = dict(self.engines)
+            stats["stages"] = {
+                stage: {"calls": calls, "seconds": seconds}
+                for stage, (calls, seconds) in iteritems(self.stages)
+            }
+        return stats
+
+
 class SearchEngineParser(object):
     """Handles persing logic for a single line in Matomo's list of search
     engines.
@@ -289,6 +1344,7 @@ class SearchEngineParser(object):
         "link_macro",
         "charsets",
         "hidden_keyword_paths",
+        "query_keys",
     )
 
     def __init__(
@@ -336,6 +1392,12 @@ class SearchEngineParser(object):
                 extractor = re.compile(extractor)
                 self.keyword_extractor[i] = extractor
 
+        # The query string params parse needs to look at
+        query_keys = {e for e in self.keyword_extractor if isinstance(e, string_types)}
+        if engine_name in ("Google", "Google Images"):
+            query_keys |= _google_params
+        self.query_keys = frozenset(query_keys)
+
         self.link_macro = link_macro
         if isinstance(charsets, string_types):
             charsets = [charsets]
@@ -380,8 +1442,19 @@ class SearchEngineParser(object):
         :returns: An :class:`ExtractResult` instance.
         """
         original_query = _serp_query_string(url_parts)
-        query = _unicode_parse_qs(original_query, keep_blank_values=True)
+        query = _scan_query(
+            original_query,
+            self.query_keys,
+            keep_blank_values=True,
+            charsets=self.charsets,
+        )
+        return self._parse_query(url_parts, original_query, query)
 
+    def _parse_query(self, url_parts, original_query, query):
+        """
+        Does the work of :meth:`parse` once the query string params it needs
+        have been decoded.
+        """
         keyword = None
         engine_name = self.engine_name
 
@@ -394,7 +1467,8 @@ class SearchEngineParser(object):
             # e.g. &prev=/search%3Fq%3Dimages%26sa%3DX%26biw%3D320%26bih%3D416%26tbm%3Disch
             engine_name = "Google Images"
             if "prev" in query:
-                query = _unicode_parse_qs(_unicode_urlparse(query["prev"][0]).query)
+                prev_query = _unicode_urlparse(query["prev"][0]).query
+                query = _scan_query(prev_query, self.query_keys)
         elif engine_name == "Google" and "as_" in original_query:
             # Google has many different ways to filter results.  When some of
             # these filters are applied, we can no longer just look for the q
@@ -465,19 +1539,8 @@ class SearchEngineParser(object):
 
         # if no keyword found, but empty/hidden keywords are allowed
         if self.hidden_keyword_paths and (keyword is None or keyword is False):
-            path_with_query_and_frag = url_parts.path
-            if url_parts.query:
-                path_with_query_and_frag += "?{}".format(url_parts.query)
-            if url_parts.fragment:
-                path_with_query_and_frag += "#{}".format(url_parts.fragment)
-            for path in self.hidden_keyword_paths:
-                if not isinstance(path, string_types):
-                    if path.search(path_with_query_and_frag):
-                        keyword = False
-                        break
-                elif path == path_with_query_and_frag:
-                    keyword = False
-                    break
+            if self._is_hidden_keyword_path(url_parts):
+                keyword = False
 
         if keyword is not None:
             # Replace special placeholder with blank string
@@ -485,6 +1548,62 @@ class SearchEngineParser(object):
                 keyword = ""
             return ExtractResult(engine_name, keyword, self)
 
+    def _is_hidden_keyword_path(self, url_parts):
+        """
+        Determine if a URL is one of the SERPs of this engine which hide the
+        keyword.
+        """
+        path_with_query_and_frag = url_parts.path
+        if url_parts.query:
+            path_with_query_and_frag += "?{}".format(url_parts.query)
+        if url_parts.fragment:
+            path_with_query_and_frag += "#{}".format(url_parts.fragment)
+        for path in self.hidden_keyword_paths:
+            if not isinstance(path, string_types):
+                if path.search(path_with_query_and_frag):
+                    return True
+            elif path == path_with_query_and_frag:
+                return True
+        return False
+
+    def _has_keyword(self, url_parts):
+        """
+        Determine if :meth:`parse` would return a result for a URL, stopping
+        at the first keyword extractor found without decoding or
+        normalizing the keyword.
+
+        :param url_parts: The SERP URL
+        :type url_parts:  A :class:`urlparse.ParseResult` with all elements
+                          as unicode
+
+        :returns: ``True`` or ``False``.
+        """
+        if type(self).parse is not SearchEngineParser.parse:
+            # Subclasses may find keywords elsewhere
+            return self.parse(url_parts) is not None
+
+        original_query = _serp_query_string(url_parts)
+        keys = self.query_keys
+        engine_name = self.engine_name
+        if engine_name in _google_engines:
+            if engine_name == "Google Images" or "/imgres" in original_query:
+                # The keyword may be in the decoded prev param
+                return self.parse(url_parts) is not None
+            if "as_" in original_query:
+                # Advanced search, a keyword is always built
+                return True
+            keys = {e for e in self.keyword_extractor if isinstance(e, string_types)}
+
+        if _query_has_key(original_query, keys, keep_blank_values=True):
+            return True
+        for extractor in self.keyword_extractor:
+            if not isinstance(extractor, string_types):
+                if extractor.search(url_parts.path):
+                    return True
+        return bool(self.hidden_keyword_paths) and self._is_hidden_keyword_path(
+            url_parts
+        )
+
     def __repr__(self):
         repr_fmt = (
             "SearchEngineParser(engine_name={!r}, "
@@ -500,124 +1619,906 @@ class SearchEngineParser(object):
         )
 
 
-def add_custom_parser(match_rule, parser):
+class EngineRegistry(object):
     """
-    Add a custom search engine parser to the cached ``_engines`` list.
-
-    :param match_rule: A match rule which is used by :func:`get_parser` to look
-                       up a parser for a given domain/path.
-    :type match_rule:  ``unicode``
-
-    :param parser:     A custom parser.
-    :type parser:      :class:`SearchEngineParser`
+    A table of search engine parsers keyed by match rule, together with the
+    indexes used to find a URL's parser in it.
+
+    Registries are immutable: :meth:`with_parser` returns a new registry
+    rather than changing this one, so a registry can be used by any number of
+    threads without locking and replaced by another in a single assignment
+    (see :func:`set_default_registry`).  The host index and the reverse
+    indexes of :func:`get_engine_domains` and friends are built on first use,
+    under a lock, and each registry has its own LRU cache of the match rules
+    found for each netloc.
+
+    :param engines:    Match rules (e.g. ``'google.{}'``) to parsers, copied
+                       by the registry.
+    :type engines:     ``dict``
+
+    :param cache_size: Number of netlocs cached, defaults to the size set
+                       with :func:`set_parser_cache_size`.
+    :type cache_size:  ``int``
+
+    :param version:    Identifier of the definitions the engines were built
+                       from.
+    :type version:     ``str``
     """
-    assert isinstance(match_rule, text_type)
-    assert isinstance(parser, SearchEngineParser)
 
-    global _engines
-    _get_search_engines()  # Ensure that the default engine list is loaded
+    __slots__ = (
+        "engines",
+        "version",
+        "_custom_parsers",
+        "_lock",
+        "_index",
+        "_metadata",
+        "_domain_cache",
+    )
 
-    _engines[match_rule] = parser
+    def __init__(self, engines, cache_size=None, version=None):
+        for match_rule, parser in iteritems(engines):
+            assert isinstance(match_rule, text_type)
+            assert isinstance(parser, SearchEngineParser)
+        #: A read-only mapping of match rules to :class:`SearchEngineParser`
+        self.engines = _read_only(dict(engines))
+        #: The SHA-1 digest of the ``search_engines.json`` the registry was
+        #: loaded from, or the ``version`` it was created with
+        self.version = version
+        # The (match_rule, parser) pairs added by with_parser, in order, so
+        # that they can be added again to a reloaded registry
+        self._custom_parsers = ()
+        self._lock = threading.Lock()
+        self._index = None
+        # The suffix list that the metadata was built with, and the
+        # _EngineMetadata, its pickled form or None if it hasn't been built
+        self._metadata = (_suffix_list, None)
+        self._domain_cache = _LRUCache(cache_size or _parser_cache_size)
+
+    @classmethod
+    def load(cls, definitions=None):
+        """
+        Build a registry from Matomo's search engine definitions.  The
+        compiled snapshot shipped with this package is used instead of the
+        definitions when they are the ones it was built from.
 
+        :param definitions: Raw contents of a ``search_engines.json``,
+                            defaults to the one shipped with this package.
+        :type definitions:  ``bytes``
 
-def get_all_query_params():
-    """
-    Return all the possible query string params for all search engines.
+        :returns: an :class:`EngineRegistry`.
+        """
+        if definitions is None:
+            definitions = pkg_resources.resource_string(__name__, "search_engines.json")
+        digest = _definitions_digest(definitions)
+        snapshot = _load_snapshot(digest)
+        if snapshot is None:
+            engines = _build_search_engines(_get_matomo_engines(definitions))
+            return cls(engines, version=digest)
+        registry = cls(snapshot["engines"], version=digest)
+        # The snapshot's metadata was built with the bundled suffix list and
+        # is only unpickled when first used
+        registry._metadata = (None, snapshot["metadata"])
+        return registry
+
+    def __len__(self):
+        return len(self.engines)
 
-    :returns: a ``list`` of all the unique query string parameters that are
-              used across the search engine definitions.
-    """
-    engines = _get_search_engines()
-    all_params = set()
-    for parser in itervalues(engines):
-        # Find non-regex params
-        params = {
-            param
-            for param in parser.keyword_extractor
-            if isinstance(param, string_types)
-        }
-        all_params |= params
+    def __repr__(self):
+        return "EngineRegistry({} match rules, version={!r})".format(
+            len(self.engines), self.version
+        )
 
-    return list(all_params)
+    def __reduce__(self):
+        args = (dict(self.engines), self._domain_cache.size(), self.version)
+        return (EngineRegistry, args, self._custom_parsers)
 
+    def __setstate__(self, state):
+        self._custom_parsers = state
+
+    @property
+    def index(self):
+        """
+        The :class:`_HostIndex` over the match rules of the registry.
+        """
+        index = self._index
+        if index is None:
+            with self._lock:
+                index = self._index
+                if index is None:
+                    index = self._index = _HostIndex(self.engines)
+        return index
+
+    @property
+    def metadata(self):
+        """
+        The :class:`_EngineMetadata` of the registry, rebuilt if the suffix
+        list has changed since it was built.
+        """
+        suffix_list = _suffix_list
+        built_with, metadata = self._metadata
+        if built_with != suffix_list or not isinstance(metadata, _EngineMetadata):
+            with self._lock:
+                built_with, metadata = self._metadata
+                if built_with != suffix_list or metadata is None:
+                    metadata = _EngineMetadata(self.engines)
+                elif not isinstance(metadata, _EngineMetadata):
+                    metadata = pickle.loads(metadata)
+                self._metadata = (suffix_list, metadata)
+        return metadata
+
+    def lookup_netloc(self, netloc):
+        """
+        Return the result of :meth:`_HostIndex.lookup` for a netloc, going
+        through the registry's netloc cache.
+
+        :returns: a ``(parser, candidates)`` tuple, where ``parser`` is the
+                  parser of every URL on the netloc when it doesn't depend on
+                  their path or query string, ``None`` otherwise, and
+                  ``candidates`` is the result of :meth:`_HostIndex.lookup`
+                  to find it with :func:`_resolve_parser`.
+        """
+        entry = self._domain_cache.get(netloc)
+        if entry is None:
+            candidates = self.index.lookup(netloc)
+            parser = None
+            if candidates:
+                subdomain, paths, key = candidates[0]
+                if not subdomain and not paths and key is not None:
+                    # What _HostIndex.resolve finds first whatever the URL
+                    parser = self.engines.get(key)
+            entry = (parser, candidates)
+            self._domain_cache.put(netloc, entry)
+        return entry
+
+    def with_parser(self, match_rule, parser):
+        """
+        Return a copy of this registry with a parser added for a match rule,
+        replacing the rule's parser if it has one.  This registry is left
+        unchanged.
+
+        :param match_rule: A match rule which is used by :func:`get_parser` to
+                           look up a parser for a given domain/path.
+        :type match_rule:  ``unicode``
+
+        :param parser:     A custom parser.
+        :type parser:      :class:`SearchEngineParser`
+
+        :returns: an :class:`EngineRegistry`.
+        """
+        assert isinstance(match_rule, text_type)
+        assert isinstance(parser, SearchEngineParser)
+
+        engines = dict(self.engines)
+        replaced = engines.get(match_rule)
+        engines[match_rule] = parser
+        registry = EngineRegistry(engines, self._domain_cache.size(), self.version)
+        registry._custom_parsers = self._custom_parsers + ((match_rule, parser),)
+        # Keep counting parser cache statistics where this registry left off
+        registry._domain_cache.stats.update(self._domain_cache.stats)
+        if self._metadata[1] is not None:
+            # Update a copy of the metadata rather than building it again
+            metadata = self.metadata.copy()
+            metadata.add(match_rule, parser, replaced)
+            registry._metadata = (_suffix_list, metadata)
+        return registry
+
+
+def get_default_registry():
+    """
+    Return the registry used by the functions of this module when they aren't
+    passed one, loaded from the bundled search engine definitions on first
+    use.
+
+    :returns: an :class:`EngineRegistry`.
+    """
+    global _registry
+    registry = _registry
+    if registry is None:
+        with _registry_lock:
+            registry = _registry
+            if registry is None:
+                registry = _registry = EngineRegistry.load()
+    return registry
+
+
+def set_default_registry(registry):
+    """
+    Replace the registry used by the functions of this module when they
+    aren't passed one.  Calls in progress in other threads finish with the
+    registry they started with.  Discards the result cache.
+
+    :param registry: The new default registry, or ``None`` to go back to the
+                     bundled search engine definitions.
+    :type registry:  :class:`EngineRegistry`
+    """
+    global _registry
+    assert registry is None or isinstance(registry, EngineRegistry)
+    with _registry_lock:
+        _registry = registry
+        clear_result_cache()
+
+
+def reload_search_engines(filename=None):
+    """
+    Rebuild the default registry from a ``search_engines.json`` file, e.g. one
+    refreshed by ``update_list.py``, and swap it in without restarting.
+    Custom parsers added to the current default registry (see
+    :func:`add_custom_parser`) are added to the new one.  Calls in progress
+    in other threads finish with the registry they started with, and the
+    result cache is discarded.
+
+    :param filename: Path of the definitions, defaults to the file shipped
+                     with this package.
+    :type filename:  ``str``
+
+    :returns: the :attr:`EngineRegistry.version` of the new default registry.
+    """
+    if filename is None:
+        definitions = pkg_resources.resource_string(__name__, "search_engines.json")
+    else:
+        with open(filename, "rb") as definitions_file:
+            definitions = definitions_file.read()
+    return _reload_definitions(definitions)
+
+
+def _reload_definitions(definitions):
+    # Build the new table outside of the lock, extraction doesn't wait on it
+    registry = EngineRegistry.load(definitions)
+    with _registry_lock:
+        for match_rule, parser in get_default_registry()._custom_parsers:
+            registry = registry.with_parser(match_rule, parser)
+        set_default_registry(registry)
+    log.info(
+        "Loaded %d search engine match rules, version %s",
+        len(registry),
+        registry.version,
+    )
+    return registry.version
+
+
+class SearchEnginesWatcher(threading.Thread):
+    """
+    A daemon thread which polls a ``search_engines.json`` file and reloads
+    the default registry with it (see :func:`reload_search_engines`) when it
+    changes.  The file is loaded as soon as the thread starts, unless it
+    holds the definitions of the current default registry.  Definitions
+    which fail to load are logged and leave the current registry in place.
+
+    :param filename: Path of the definitions.
+    :type filename:  ``str``
+
+    :param interval: Number of seconds between checks of the file.
+    :type interval:  ``int`` or ``float``
+
+    :param callback: Optional function called with the new
+                     :attr:`EngineRegistry.version` after each reload.
+    :type callback:  ``callable``
+    """
+
+    def __init__(self, filename, interval=30, callback=None):
+        super(SearchEnginesWatcher, self).__init__(name="SearchEnginesWatcher")
+        self.daemon = True
+        self.filename = filename
+        self.interval = interval
+        self.callback = callback
+        self._signature = None
+        self._stopped = threading.Event()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size, stat.st_ino)
+
+    def check(self):
+        """
+        Reload the definitions if the file has changed since the last check.
+
+        :returns: the version of the new default registry, or ``None`` if it
+                  wasn't replaced.
+        """
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return None
+        self._signature = signature
+        with open(self.filename, "rb") as definitions_file:
+            definitions = definitions_file.read()
+        if _definitions_digest(definitions) == get_default_registry().version:
+            return None
+        version = _reload_definitions(definitions)
+        if self.callback is not None:
+            self.callback(version)
+        return version
+
+    def run(self):
+        while True:
+            try:
+                self.check()
+            except Exception:
+                log.exception(
+                    "Could not reload search engine definitions from %s",
+                    self.filename,
+                )
+            if self._stopped.wait(self.interval):
+                return
+
+    def stop(self):
+        """
+        Stop watching the file and wait for the thread to finish.
+        """
+        self._stopped.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+
+def add_custom_parser(match_rule, parser):
+    """
+    Add a custom search engine parser to the default registry, which is
+    replaced by a copy with the parser added (see
+    :meth:`EngineRegistry.with_parser`).
+
+    :param match_rule: A match rule which is used by :func:`get_parser` to look
+                       up a parser for a given domain/path.
+    :type match_rule:  ``unicode``
+
+    :param parser:     A custom parser.
+    :type parser:      :class:`SearchEngineParser`
+    """
+    assert isinstance(match_rule, text_type)
+    assert isinstance(parser, SearchEngineParser)
+
+    global _registry
+    _get_engine_ids()  # Number the default engines before custom ones
+    with _registry_lock:
+        _registry = get_default_registry().with_parser(match_rule, parser)
+        clear_result_cache()
+
+
+def get_parser_cache_stats():
+    """
+    Return statistics for the cache that :func:`get_parser` uses to avoid
+    resolving the same netloc over and over, for the default registry.
+
+    :returns: a ``dict`` with the cache's ``size`` (capacity), ``length``
+              (number of cached netlocs) and cumulative ``hits``, ``misses``
+              and ``evictions``.
+    """
+    return get_default_registry()._domain_cache.get_stats()
+
+
+def add_keyword_normalizer(func):
+    """
+    Add a function to run on every keyword that :func:`extract` finds, after
+    the normalization selected by its ``lower_case``, ``trimmed`` and
+    ``collapse_whitespace`` options.  Functions run in the order they were
+    added.
+
+    :param func: A function taking a keyword and returning it normalized.
+    :type func:  ``callable``
+    """
+    _keyword_normalizers.append(func)
+    _normalization_steps.clear()
+    clear_result_cache()
+
+
+def remove_keyword_normalizer(func):
+    """
+    Remove a function added by :func:`add_keyword_normalizer`.
+
+    :param func: The function to remove.
+    :type func:  ``callable``
+    """
+    _keyword_normalizers.remove(func)
+    _normalization_steps.clear()
+    clear_result_cache()
+
+
+def enable_result_cache(size=10000, ttl=None):
+    """
+    Cache the results of :func:`extract` and :func:`extract_many` for URLs
+    which are seen over and over.  Results are keyed on the URL and the
+    normalization options; calls passing a ``parser`` are never cached.
+    Enabling the cache again replaces it with an empty one.
+
+    :param size: Maximum number of cached results, must be greater than zero.
+    :type size:  ``int``
+
+    :param ttl:  Optional number of seconds after which a cached result
+                 expires.
+    :type ttl:   ``int`` or ``float``
+    """
+    global _result_cache
+    if size < 1:
+        raise ValueError("Result cache size must be greater than zero.")
+    if ttl is not None and ttl <= 0:
+        raise ValueError("Result cache TTL must be greater than zero.")
+    _result_cache = _ResultCache(size, ttl)
+
+
+def disable_result_cache():
+    """
+    Stop caching the results of :func:`extract` and discard the cache.
+    """
+    global _result_cache
+    _result_cache = None
+
+
+def clear_result_cache():
+    """
+    Discard all cached results of :func:`extract`, if the result cache is
+    enabled.  Called by :func:`add_custom_parser` and whenever the default
+    registry is replaced.
+    """
+    global _result_cache
+    with _registry_lock:
+        cache = _result_cache
+        if cache is not None:
+            # Replaced rather than emptied, so that results still being
+            # extracted with a previous registry are put in the old cache
+            _result_cache = cache.emptied()
+
+
+def enable_stats(callback=None):
+    """
+    Time the stages of :func:`extract` and :func:`extract_many` and count
+    their outcomes, see :func:`get_stats`.  Disabled by default, since
+    timing each stage slows extraction down.  Enabling stats again starts
+    counting from zero.
+
+    :param callback: Optional function called with ``(timings, outcome,
+                     engine_name)`` after each extracted URL, e.g. to
+                     forward them to Prometheus or StatsD.  ``timings`` is a
+                     ``dict`` of the stages the URL went through to their
+                     duration in seconds and ``outcome`` is one of
+                     ``'serp'``, ``'naive'``, ``'not_serp'`` or
+                     ``'malformed'``.  Exceptions it raises are logged.
+    :type callback:  ``callable``
+    """
+    global _stats
+    _stats = _Stats(callback)
+
+
+def disable_stats():
+    """
+    Stop timing :func:`extract` and discard the stats.
+    """
+    global _stats
+    _stats = None
+
+
+def reset_stats():
+    """
+    Start counting the stats enabled by :func:`enable_stats` from zero.
+    """
+    stats = _stats
+    if stats is not None:
+        stats.reset()
+
+
+def get_stats():
+    """
+    Return the stats enabled by :func:`enable_stats`, cumulative since they
+    were enabled or reset.  URLs answered by the result cache (see
+    :func:`enable_result_cache`) and repeated URLs of
+    :func:`extract_many` aren't counted.
+
+    Stages are ``prefilter`` (:func:`might_be_serp`), ``urlparse``,
+    ``get_parser``, ``query`` (decoding the query string),
+    ``parse`` or ``parse_google`` for Google's special cases (finding the
+    keyword), ``fall_through`` (less specific parsers tried when the URL's
+    parser finds no keyword), ``normalize`` and ``naive`` (naive search
+    engine detection).  The ``parse`` of a :class:`SearchEngineParser`
+    subclass overriding it includes decoding the query string.
+
+    URLs whose host rules them out are counted as ``not_serp`` without being
+    parsed, so ``malformed`` only counts the URLs which got past the
+    prefilter but couldn't be parsed.
+
+    :returns: ``None`` if stats are disabled, otherwise a ``dict`` with the
+              number of ``urls`` extracted, the count of each outcome
+              (``serp``, ``naive``, ``not_serp`` and ``malformed``),
+              ``engines`` mapping engine names to the number of keywords
+              found and ``stages`` mapping stage names to a ``dict`` of
+              their number of ``calls`` and cumulative ``seconds``.
+    """
+    stats = _stats
+    if stats is None:
+        return None
+    return stats.get_stats()
+
+
+def get_result_cache_stats():
+    """
+    Return statistics for the result cache enabled by
+    :func:`enable_result_cache`.
+
+    :returns: ``None`` if the cache is disabled, otherwise a ``dict`` with
+              the cache's ``size`` (capacity), ``length`` (number of cached
+              results), ``ttl`` and cumulative ``hits``, ``misses``,
+              ``evictions`` and ``expirations``.
+    """
+    cache = _result_cache
+    if cache is None:
+        return None
+    return cache.get_stats()
+
+
+def _get_engine_ids():
+    """
+    Return the ``dict`` of engine names to IDs, numbering the engines of the
+    default table in name order, then naive detection, on first use.
+    """
+    global _engine_names, _engine_ids
+    if _engine_ids is None:
+        with _registry_lock:
+            if _engine_ids is None:
+                engines = _get_search_engines()
+                names = {parser.engine_name for parser in itervalues(engines)}
+                _engine_names = [None] + sorted(names) + [_naive_engine_name]
+                _engine_ids = {name: i for i, name in enumerate(_engine_names)}
+    return _engine_ids
+
+
+def get_engine_id(engine_name):
+    """
+    Return the integer ID of an engine name, used by :func:`extract_compact`
+    and :func:`extract_columns`.
+
+    The engines of the default table are numbered from 1 in name order, so
+    their IDs are the same in every process using the same list of search
+    engines.  The next ID, named ``"(naive)"``, is shared by all the results
+    of naive detection.  Other engine names (from custom parsers) are
+    numbered after it in the order they are first seen.  0 stands for no
+    engine.
+
+    :param engine_name: Name of an engine.
+    :type engine_name:  ``unicode``
+
+    :returns: an ``int``.
+    """
+    engine_ids = _get_engine_ids()
+    engine_id = engine_ids.get(engine_name)
+    if engine_id is None:
+        with _registry_lock:
+            engine_id = engine_ids.get(engine_name)
+            if engine_id is None:
+                # Named before being numbered so that IDs are always valid
+                _engine_names.append(engine_name)
+                engine_id = engine_ids[engine_name] = len(_engine_names) - 1
+    return engine_id
+
+
+def get_engine_names():
+    """
+    Return the engine names indexed by the IDs of :func:`get_engine_id`.
+
+    :returns: a ``list`` whose first item, for ID 0, is ``None``.
+    """
+    _get_engine_ids()
+    return list(_engine_names)
+
+
+def get_search_engine_stats(registry=None):
+    """
+    Return the size of the table of search engine parsers.
+
+    :param registry: Registry to look the engines up in, defaults to
+                     :func:`get_default_registry`.
+    :type registry:  :class:`EngineRegistry`
+
+    :returns: a ``dict`` with the number of ``domains`` in the table (with
+              templated domains such as ``google.{}`` counted once) and the
+              number of distinct ``parsers`` they share.
+    """
+    engines = (registry or get_default_registry()).engines
+    return {
+        "domains": len(engines),
+        "parsers": len({id(parser) for parser in itervalues(engines)}),
+    }
+
+
+def set_parser_cache_size(size):
+    """
+    Change the number of netlocs that :func:`get_parser` caches, for the
+    default registry and for registries created from now on.  Shrinking the
+    cache evicts the least recently used netlocs.
+
+    :param size: New capacity of the cache, must be greater than zero.
+    :type size:  ``int``
+    """
+    global _parser_cache_size
+    if size < 1:
+        raise ValueError("Parser cache size must be greater than zero.")
+    with _registry_lock:
+        _parser_cache_size = size
+        get_default_registry()._domain_cache.size(size)
 
-def get_all_query_params_by_domain():
-    """
-    Return all the possible query string params for all search engines.
+
+def get_all_query_params(registry=None):
+    """
+    Return all the possible query string params for all search engines.
+
+    :param registry: Registry to look the engines up in, defaults to
+                     :func:`get_default_registry`.
+    :type registry:  :class:`EngineRegistry`
 
     :returns: a ``list`` of all the unique query string parameters that are
               used across the search engine definitions.
     """
-    global _qs_params
-    if _qs_params:
-        return _qs_params
-    engines = _get_search_engines()
-    param_dict = defaultdict(list)
-    for domain, parser in iteritems(engines):
-        # Find non-regex params
-        params = {
-            param
-            for param in parser.keyword_extractor
-            if isinstance(param, string_types)
+    metadata = (registry or get_default_registry()).metadata
+    return [param for param, rules in iteritems(metadata.rules_by_param) if rules]
+
+
+def get_all_query_params_by_domain(registry=None):
+    """
+    Return all the possible query string params for all search engines.
+
+    :param registry: Registry to look the engines up in, defaults to
+                     :func:`get_default_registry`.
+    :type registry:  :class:`EngineRegistry`
+
+    :returns: a ``dict`` of registrable domains (e.g. ``'google.co.uk'``) to
+              sorted ``list`` of the query string parameters used by the
+              search engines on them.
+    """
+    registry = registry or get_default_registry()
+    return registry.metadata.params_by_domain(registry.engines)
+
+
+def get_engine_parsers(engine_name, registry=None):
+    """
+    Return the parsers of an engine.
+
+    :param engine_name: Name of an engine, e.g. ``'Google'``.
+    :type engine_name:  ``unicode``
+
+    :param registry:    Registry to look the engine up in, defaults to
+                        :func:`get_default_registry`.
+    :type registry:     :class:`EngineRegistry`
+
+    :returns: a ``list`` of the distinct :class:`SearchEngineParser` of the
+              engine, empty for unknown engines.
+    """
+    registry = registry or get_default_registry()
+    engines = registry.engines
+    parsers = []
+    for match_rule in sorted(registry.metadata.rules_by_name.get(engine_name, ())):
+        parser = engines.get(match_rule)
+        if parser is not None and not any(parser is other for other in parsers):
+            parsers.append(parser)
+    return parsers
+
+
+def get_engine_domains(engine_name, registry=None):
+    """
+    Return the match rules of an engine, i.e. the domains (optionally with a
+    path, and with ``{}`` standing for any country code) that its parsers are
+    used for.
+
+    :param engine_name: Name of an engine, e.g. ``'Google'``.
+    :type engine_name:  ``unicode``
+
+    :param registry:    Registry to look the engine up in, defaults to
+                        :func:`get_default_registry`.
+    :type registry:     :class:`EngineRegistry`
+
+    :returns: a sorted ``list`` of match rules, e.g. ``['google.{}', ...]``,
+              empty for unknown engines.
+    """
+    metadata = (registry or get_default_registry()).metadata
+    return sorted(metadata.rules_by_name.get(engine_name, ()))
+
+
+def get_query_param_engines(param, registry=None):
+    """
+    Return the engines which may carry keywords in a query string param.
+
+    :param param:    A query string param, e.g. ``'q'``.
+    :type param:     ``unicode``
+
+    :param registry: Registry to look the engines up in, defaults to
+                     :func:`get_default_registry`.
+    :type registry:  :class:`EngineRegistry`
+
+    :returns: a sorted ``list`` of engine names, empty for unknown params.
+    """
+    registry = registry or get_default_registry()
+    engines = registry.engines
+    rules = registry.metadata.rules_by_param.get(param, ())
+    return sorted(
+        {
+            engines[match_rule].engine_name
+            for match_rule in rules
+            if match_rule in engines
         }
-        tld_res = tldextract.extract(domain)
-        domain = tld_res.registered_domain
-        param_dict[domain] = sorted(set(param_dict[domain]) | params)
-    _qs_params = param_dict
-    return param_dict
+    )
 
 
-def get_parser(referring_url):
+def might_be_serp(referring_url, use_naive_method=False, registry=None):
+    """
+    Quickly determine if a referring URL could be a SERP, without parsing it.
+    This only looks at the host, so a ``False`` result means that
+    :func:`extract` would certainly return ``None`` while a ``True`` result
+    means that it may or may not find a keyword.
+
+    :param referring_url:    Suspected SERP URL.
+    :type referring_url:     ``str`` or :class:`urlparse.ParseResult`
+
+    :param use_naive_method: Whether naive search engine detection will be
+                             used, see :func:`extract`.
+    :type use_naive_method:  ``True`` or ``False``
+
+    :param registry:         Registry of search engines, defaults to
+                             :func:`get_default_registry`.
+    :type registry:          :class:`EngineRegistry`
+
+    :returns: ``False`` if the URL is certainly not a SERP, ``True``
+              otherwise.
+    """
+    url = referring_url
+    if type(url) is not text_type:
+        if isinstance(url, ParseResult):
+            host = url.netloc
+            if not isinstance(host, text_type):
+                return True
+            url = None
+        elif isinstance(url, bytes):
+            url = url.decode("utf-8", "ignore")
+        elif not isinstance(url, text_type):
+            # Left to urlparse to accept or reject
+            return True
+
+    if url is not None:
+        if "\t" in url or "\r" in url or "\n" in url:
+            # urlparse drops these wherever they are
+            for char in "\t\r\n":
+                url = url.replace(char, "")
+        rest = url.partition("//")[2]
+        # Keyed on everything up to the path so that known hosts are
+        # answered before any query string or fragment is stripped
+        host = rest.partition("/")[0]
+
+    if use_naive_method and "search." in host:
+        return True
+
+    if registry is None:
+        registry = _registry or get_default_registry()
+    index = registry._index
+    if index is None:
+        index = registry.index
+    hosts = index.hosts
+    result = hosts.get(host)
+    if result is None:
+        bare_host = host
+        if "?" in bare_host:
+            bare_host = bare_host.partition("?")[0]
+        if "#" in bare_host:
+            bare_host = bare_host.partition("#")[0]
+        result = _host_might_be_serp(bare_host, index.domain_labels)
+        if len(hosts) >= _host_cache_size:
+            hosts.clear()
+        hosts[host] = result
+    if result:
+        return True
+
+    # Google custom search engines and InfoSpace's private-label search
+    # can be on any host
+    if url is None:
+        return _netloc_free_rule(referring_url) is not None
+    return "?cx=partner-pub" in rest or "/pemonitorhosted/ws/results/" in rest
+
+
+def _host_might_be_serp(host, domain_labels, use_naive_method=False):
+    """
+    Does the work of :func:`might_be_serp` once the host has been found.
+
+    :param host:             Host of a URL, possibly with a port.
+    :type host:              ``str`` or ``bytes``
+
+    :param domain_labels:    The :attr:`_HostIndex.domain_labels` of a
+                             registry, of the same type as ``host``.
+    :type domain_labels:     ``set`` or ``frozenset``
+
+    :param use_naive_method: Whether naive search engine detection will be
+                             used, see :func:`extract`.
+    :type use_naive_method:  ``True`` or ``False``
+    """
+    if isinstance(host, bytes):
+        dot = b"."
+        naive_marker = b"search."
+        second_level_domains = _registrable_second_level_domain_bytes
+    else:
+        dot = "."
+        naive_marker = "search."
+        second_level_domains = _registrable_second_level_domains
+
+    if use_naive_method and naive_marker in host:
+        return True
+
+    # The label naming the registrable domain is either the second to last
+    # (google.com) or the third to last when under a second level domain
+    # (google.co.uk)
+    labels = host.rsplit(dot, 3)
+    if labels[-1] in domain_labels:
+        return True
+    if len(labels) > 1:
+        if labels[-2] in domain_labels:
+            return True
+        if len(labels) > 2 and labels[-2] in second_level_domains:
+            return labels[-3] in domain_labels
+    return False
+
+
+def get_parser(referring_url, registry=None):
     """
     Utility function to find a parser for a referring URL if it is a SERP.
 
     :param referring_url: Suspected SERP URL.
     :type referring_url:  ``str`` or :class:`urlparse.ParseResult`
 
+    :param registry:      Registry to find the parser in, defaults to
+                          :func:`get_default_registry`.
+    :type registry:       :class:`EngineRegistry`
+
     :returns: :class:`SearchEngineParser` object if one exists for URL,
               ``None`` otherwise.
     """
-    engines = _get_search_engines()
+    registry = registry or _registry or get_default_registry()
     url_parts = _unicode_urlparse(referring_url)
     if url_parts is None:
         return None
 
-    query = _serp_query_string(url_parts)
-
-    domain = url_parts.netloc
-    path = url_parts.path
-    engine_key = url_parts.netloc
-    stripped_domain = domain[4:] if domain.startswith("www.") else None
-    # Try to find a parser in the engines list.  We go from most specific to
-    # least specific order:
-    # 1. <domain><path>
-    # 2. <custom search engines>
-    # 3. <domain>
-    # 4. <stripped_domain>
-    # The second step has some special exceptions for things like Google custom
-    # search engines, yahoo and yahoo images
-    if "{}{}".format(domain, path) in engines:
-        engine_key = "{}{}".format(domain, path)
-    elif domain not in engines and stripped_domain not in engines:
-        if query[:14] == "cx=partner-pub":
-            # Google custom search engine
-            engine_key = "google.com/cse"
-        elif url_parts.path[:28] == "/pemonitorhosted/ws/results/":
-            # private-label search powered by InfoSpace Metasearch
-            engine_key = "wsdsold.infospace.com"
-        elif ".images.search.yahoo.com" in url_parts.netloc:
-            # Yahoo! Images
-            engine_key = "images.search.yahoo.com"
-        elif ".search.yahoo.com" in url_parts.netloc:
-            # Yahoo!
-            engine_key = "search.yahoo.com"
-        else:
-            return None
+    parser, candidates = registry.lookup_netloc(url_parts.netloc)
+    if parser is None:
+        parser = _resolve_parser(registry.engines, url_parts, candidates)
+    return parser
+
 
-    return engines.get(engine_key) or engines.get(stripped_domain)
+def _resolve_parser(engines, url_parts, candidates):
+    """
+    Find the parser for a URL given the match rules found for its netloc.
+
+    :param engines:    The engine table of an :class:`EngineRegistry`.
+    :type engines:     ``dict``
 
+    :param url_parts:  A URL.
+    :type url_parts:   :class:`urlparse.ParseResult`
 
-def is_serp(referring_url, parser=None, use_naive_method=False):
+    :param candidates: Result of :meth:`_HostIndex.lookup` for the netloc.
+    :type candidates:  ``tuple``
+    """
+    # Find the most specific match rule for the netloc and path
+    fallback = _netloc_free_rule(url_parts)
+    return _HostIndex.resolve(engines, candidates, url_parts.path, fallback)
+
+
+def _netloc_free_rule(url_parts):
+    """
+    Return the match rule which applies to a URL whatever its netloc, if
+    any: Google custom search engines and private-label search powered by
+    InfoSpace Metasearch.
+    """
+    if url_parts.query.startswith("cx=partner-pub"):
+        return "google.com/cse"
+    elif url_parts.path.startswith("/pemonitorhosted/ws/results/"):
+        return "wsdsold.infospace.com"
+    return None
+
+
+def _fall_through(engines, url_parts, candidates, parser):
+    """
+    Generate the parsers to try on a URL after ``parser``, the one
+    :func:`_resolve_parser` found for it, finds no keyword: the less specific
+    rules matching the URL, in order.
+    """
+    fallback = _netloc_free_rule(url_parts)
+    for other in _HostIndex.resolve_all(engines, candidates, url_parts.path, fallback):
+        if other is not parser:
+            yield other
+
+
+def is_serp(referring_url, parser=None, use_naive_method=False, registry=None):
     """
     Utility function to determine if a referring URL is a SERP.
 
@@ -634,10 +2535,42 @@ def is_serp(referring_url, parser=None, use_naive_method=False):
                              :func:`extract` for more information.
     :type use_naive_method:  ``True`` or ``False``
 
+    :param registry:         Registry of search engines, defaults to
+                             :func:`get_default_registry`.
+    :type registry:          :class:`EngineRegistry`
+
     :returns: ``True`` if SERP, ``False`` otherwise.
     """
-    res = extract(referring_url, parser=parser, use_naive_method=use_naive_method)
-    return res is not None
+    # Equivalent to extract(...) is not None, but the keyword is never
+    # decoded, normalized or wrapped in an ExtractResult
+    if parser is None:
+        registry = registry or _registry or get_default_registry()
+        if not might_be_serp(referring_url, use_naive_method, registry):
+            return False
+
+    url_parts = _unicode_urlparse(referring_url)
+    if url_parts is None:
+        return False
+
+    if parser is not None:
+        return parser._has_keyword(url_parts)
+
+    engines = registry.engines
+    parser, candidates = registry.lookup_netloc(url_parts.netloc)
+    if parser is None:
+        parser = _resolve_parser(engines, url_parts, candidates)
+    if parser is not None:
+        if parser._has_keyword(url_parts):
+            return True
+        for other in _fall_through(engines, url_parts, candidates, parser):
+            if other._has_keyword(url_parts):
+                return True
+
+    return bool(
+        use_naive_method
+        and _naive_re.search(url_parts.netloc)
+        and _query_has_key(url_parts.query, _naive_param_set, keep_blank_values=True)
+    )
 
 
 def extract(
@@ -647,6 +2580,7 @@ def extract(
     trimmed=True,
     collapse_whitespace=True,
     use_naive_method=False,
+    registry=None,
 ):
     """
     Parse a SERP URL and return information regarding the engine name,
@@ -676,46 +2610,613 @@ def extract(
                                 a keyword using ``_naive_params``.
     :type use_naive_method:     ``True`` or ``False``
 
+    :param registry:            Registry to find the parser in, defaults to
+                                :func:`get_default_registry`.  Results are
+                                only cached (see :func:`enable_result_cache`)
+                                for the default registry.
+    :type registry:             :class:`EngineRegistry`
+
     :returns: an :class:`ExtractResult` instance if ``serp_url`` is valid,
               ``None`` otherwise
     """
+    cache = _result_cache
+    if parser is None and registry is None and cache is not None:
+        key = (serp_url, lower_case, trimmed, collapse_whitespace, use_naive_method)
+        result = cache.get(key)
+        if result is cache.missing:
+            result = _extract_url(
+                serp_url,
+                None,
+                lower_case,
+                trimmed,
+                collapse_whitespace,
+                use_naive_method,
+                None,
+            )
+            cache.put(key, result)
+        return result
+
+    return _extract_url(
+        serp_url,
+        parser,
+        lower_case,
+        trimmed,
+        collapse_whitespace,
+        use_naive_method,
+        registry,
+    )
+
+
+def _extract_url(
+    serp_url,
+    parser,
+    lower_case,
+    trimmed,
+    collapse_whitespace,
+    use_naive_method,
+    registry,
+):
+    """
+    Does the work of :func:`extract` without consulting the result cache.
+    """
+    if _stats is not None:
+        return _extract_url_timed(
+            serp_url,
+            parser,
+            lower_case,
+            trimmed,
+            collapse_whitespace,
+            use_naive_method,
+            registry,
+        )
+
+    if parser is None:
+        registry = registry or _registry or get_default_registry()
+        if not might_be_serp(serp_url, use_naive_method, registry):
+            return None
+
     # Software should only work with Unicode strings internally, converting
     # to a particular encoding on output.
     url_parts = _unicode_urlparse(serp_url)
     if url_parts is None:
         return None
 
+    if parser is not None:
+        return _extract(
+            url_parts,
+            parser,
+            lower_case,
+            trimmed,
+            collapse_whitespace,
+            use_naive_method,
+        )
+
+    parser, candidates = registry.lookup_netloc(url_parts.netloc)
+    if parser is None:
+        parser = _resolve_parser(registry.engines, url_parts, candidates)
+    return _extract(
+        url_parts,
+        parser,
+        lower_case,
+        trimmed,
+        collapse_whitespace,
+        use_naive_method,
+        registry.engines,
+        candidates,
+    )
+
+
+def _extract_url_timed(
+    serp_url,
+    parser,
+    lower_case,
+    trimmed,
+    collapse_whitespace,
+    use_naive_method,
+    registry,
+):
+    """
+    Does the work of :func:`_extract_url` while stats are enabled, recording
+    the time spent in each stage.
+    """
+    stats = _stats
+    if stats is None:
+        # Disabled meanwhile
+        return _extract_url(
+            serp_url,
+            parser,
+            lower_case,
+            trimmed,
+            collapse_whitespace,
+            use_naive_method,
+            registry,
+        )
+
+    clock = _perf_clock
+    timings = {}
     result = None
+    outcome = "not_serp"
+    start = clock()
     if parser is None:
-        parser = get_parser(url_parts)
+        registry = registry or _registry or get_default_registry()
+        serp = might_be_serp(serp_url, use_naive_method, registry)
+        now = clock()
+        timings["prefilter"] = now - start
+        start = now
+        if not serp:
+            stats.record(timings, outcome, None)
+            return None
 
+    url_parts = _unicode_urlparse(serp_url)
+    now = clock()
+    timings["urlparse"] = now - start
+    start = now
+    if url_parts is None:
+        stats.record(timings, "malformed", None)
+        return None
+
+    candidates = None
     if parser is None:
-        if not use_naive_method:
-            return None  # Tried to get keyword from non SERP URL
+        parser, candidates = registry.lookup_netloc(url_parts.netloc)
+        if parser is None:
+            parser = _resolve_parser(registry.engines, url_parts, candidates)
+        now = clock()
+        timings["get_parser"] = now - start
+        start = now
+
+    if parser is not None and type(parser).parse is not SearchEngineParser.parse:
+        # Subclasses may not decode the query string the same way, so their
+        # parse is timed as a whole
+        result = parser.parse(url_parts)
+        now = clock()
+        timings["parse"] = now - start
+        start = now
+    elif parser is not None:
+        original_query = _serp_query_string(url_parts)
+        query = _scan_query(
+            original_query,
+            parser.query_keys,
+            keep_blank_values=True,
+            charsets=parser.charsets,
+        )
+        now = clock()
+        timings["query"] = now - start
+        start = now
+
+        result = parser._parse_query(url_parts, original_query, query)
+        now = clock()
+        if parser.engine_name in _google_engines:
+            timings["parse_google"] = now - start
+        else:
+            timings["parse"] = now - start
+        start = now
+
+    if parser is not None and result is None and candidates is not None:
+        for other in _fall_through(registry.engines, url_parts, candidates, parser):
+            result = other.parse(url_parts)
+            if result is not None:
+                break
+        now = clock()
+        timings["fall_through"] = now - start
+        start = now
+
+    if result is not None:
+        outcome = "serp"
+        _normalize(result, lower_case, trimmed, collapse_whitespace)
+        now = clock()
+        timings["normalize"] = now - start
+        start = now
+
+    if use_naive_method and (parser is None or candidates is not None):
+        if result is None or _prefers_naive(result, candidates):
+            naive_result = _extract_naive(url_parts)
+            timings["naive"] = clock() - start
+            if naive_result is not None:
+                result = naive_result
+                outcome = "naive"
+
+    stats.record(timings, outcome, None if result is None else result.engine_name)
+    return result
 
-        # Try to use naive method of detection
-        if _naive_re.search(url_parts.netloc):
-            query = _unicode_parse_qs(url_parts.query, keep_blank_values=True)
-            for param in _naive_params:
-                if param in query:
-                    tld_res = tldextract.extract(url_parts.netloc)
-                    return ExtractResult(tld_res.domain, query[param][0], None)
 
-        return None  # Naive method could not detect a keyword either
+def extract_many(
+    serp_urls,
+    parser=None,
+    lower_case=True,
+    trimmed=True,
+    collapse_whitespace=True,
+    use_naive_method=False,
+    registry=None,
+):
+    """
+    Parse many SERP URLs at once.  Equivalent to calling :func:`extract` on
+    each URL, but every distinct URL is only parsed once and the match rules
+    for every distinct netloc are only looked up once.
+
+    :param serp_urls: Suspected SERP URLs to extract keywords from.
+    :type serp_urls:  an iterable of ``str`` or :class:`urlparse.ParseResult`
 
-    result = parser.parse(url_parts)
+    See :func:`extract` for a description of the other arguments.
 
+    :returns: a ``list`` with an :class:`ExtractResult` instance or ``None``
+              for each of ``serp_urls``, in the same order.
+    """
+    extracted = []
+    for result, repeated in _iter_extract(
+        serp_urls,
+        parser,
+        lower_case,
+        trimmed,
+        collapse_whitespace,
+        use_naive_method,
+        registry,
+    ):
+        if repeated and result is not None:
+            # Don't hand out the same mutable result twice
+            result = ExtractResult(result.engine_name, result.keyword, result.parser)
+        extracted.append(result)
+
+    return extracted
+
+
+def extract_compact(
+    serp_url,
+    parser=None,
+    lower_case=True,
+    trimmed=True,
+    collapse_whitespace=True,
+    use_naive_method=False,
+    registry=None,
+):
+    """
+    Parse a SERP URL like :func:`extract`, but return a
+    :class:`CompactResult` with an integer engine ID (see
+    :func:`get_engine_id`) and an interned keyword instead of an
+    :class:`ExtractResult`.  See :func:`extract` for a description of the
+    arguments.
+
+    :returns: a :class:`CompactResult` if ``serp_url`` is valid, ``None``
+              otherwise.
+    """
+    result = extract(
+        serp_url,
+        parser,
+        lower_case,
+        trimmed,
+        collapse_whitespace,
+        use_naive_method,
+        registry,
+    )
     if result is None:
         return None
+    if result.parser is None:
+        engine_id = get_engine_id(_naive_engine_name)
+    else:
+        engine_id = get_engine_id(result.engine_name)
+    return CompactResult(engine_id, _intern(result.keyword))
 
+
+def extract_columns(
+    serp_urls,
+    engine_ids=None,
+    keywords=None,
+    parser=None,
+    lower_case=True,
+    trimmed=True,
+    collapse_whitespace=True,
+    use_naive_method=False,
+    chunksize=10000,
+    registry=None,
+):
+    """
+    Parse many SERP URLs like :func:`extract_many`, appending their engine
+    IDs (see :func:`get_engine_id`) and interned keywords to two columns
+    instead of returning a result object per URL.  See :func:`extract` for a
+    description of the other arguments.
+
+    :param serp_urls:  Suspected SERP URLs to extract keywords from.
+    :type serp_urls:   an iterable of ``str`` or
+                       :class:`urlparse.ParseResult`
+
+    :param engine_ids: Column to append engine IDs to, 0 for non-SERPs.  A
+                       new ``array('H')`` by default.
+    :type engine_ids:  :class:`array.array` or ``list``
+
+    :param keywords:   Column to append keywords to, ``None`` for non-SERPs.
+                       A new ``list`` by default.
+    :type keywords:    ``list``
+
+    :param chunksize:  Number of URLs deduplicated at once.
+    :type chunksize:   ``int``
+
+    :returns: a ``(engine_ids, keywords)`` tuple.
+    """
+    if engine_ids is None:
+        engine_ids = array(str("H"))
+    if keywords is None:
+        keywords = []
+    ids = _get_engine_ids()
+    naive_id = ids[_naive_engine_name]
+    add_id = engine_ids.append
+    add_keyword = keywords.append
+    iterator = iter(serp_urls)
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if not chunk:
+            return engine_ids, keywords
+        for result, _ in _iter_extract(
+            chunk,
+            parser,
+            lower_case,
+            trimmed,
+            collapse_whitespace,
+            use_naive_method,
+            registry,
+        ):
+            if result is None:
+                add_id(0)
+                add_keyword(None)
+            elif result.parser is None:
+                add_id(naive_id)
+                add_keyword(_intern(result.keyword))
+            else:
+                engine_id = ids.get(result.engine_name)
+                if engine_id is None:
+                    engine_id = get_engine_id(result.engine_name)
+                add_id(engine_id)
+                add_keyword(_intern(result.keyword))
+
+
+def _iter_extract(
+    serp_urls,
+    parser,
+    lower_case,
+    trimmed,
+    collapse_whitespace,
+    use_naive_method,
+    registry,
+):
+    """
+    Does the work of :func:`extract_many`, generating a ``(result,
+    repeated)`` pair for each URL where ``repeated`` is ``True`` if the same
+    result was already generated for an earlier occurrence of the URL.
+    """
+    cache = _result_cache if parser is None and registry is None else None
+    stats = _stats
+    registry = registry or get_default_registry()
+    engines = registry.engines
+    results = {}
+    netloc_candidates = {}
+    for serp_url in serp_urls:
+        try:
+            result = results[serp_url]
+        except KeyError:
+            if cache is not None:
+                key = (
+                    serp_url,
+                    lower_case,
+                    trimmed,
+                    collapse_whitespace,
+                    use_naive_method,
+                )
+                result = cache.get(key)
+                if result is not cache.missing:
+                    results[serp_url] = result
+                    yield result, False
+                    continue
+
+            result = None
+            url_parts = None
+            if stats is not None:
+                result = _extract_url_timed(
+                    serp_url,
+                    parser,
+                    lower_case,
+                    trimmed,
+                    collapse_whitespace,
+                    use_naive_method,
+                    registry,
+                )
+            elif parser is not None or might_be_serp(
+                serp_url, use_naive_method, registry
+            ):
+                url_parts = _unicode_urlparse(serp_url)
+            if url_parts is not None:
+                url_parser = parser
+                candidates = None
+                if url_parser is None:
+                    netloc = url_parts.netloc
+                    entry = netloc_candidates.get(netloc)
+                    if entry is None:
+                        entry = registry.lookup_netloc(netloc)
+                        netloc_candidates[netloc] = entry
+                    url_parser, candidates = entry
+                    if url_parser is None:
+                        url_parser = _resolve_parser(engines, url_parts, candidates)
+                result = _extract(
+                    url_parts,
+                    url_parser,
+                    lower_case,
+                    trimmed,
+                    collapse_whitespace,
+                    use_naive_method,
+                    engines,
+                    candidates,
+                )
+            if cache is not None:
+                cache.put(key, result)
+            results[serp_url] = result
+            yield result, False
+        else:
+            yield result, True
+
+
+def _extract(
+    url_parts,
+    parser,
+    lower_case,
+    trimmed,
+    collapse_whitespace,
+    use_naive_method,
+    engines=None,
+    candidates=None,
+):
+    """
+    Does the work of :func:`extract` once the URL has been parsed and its
+    parser (if any) has been found.  When the parser was found in
+    ``engines`` from the ``candidates`` of the URL's netloc, less specific
+    parsers and then the naive method are tried if it finds no keyword.
+    """
+    result = None
+    if parser is not None:
+        result = parser.parse(url_parts)
+        if result is None:
+            if candidates is None:
+                return None  # A parser passed by the caller
+            for other in _fall_through(engines, url_parts, candidates, parser):
+                result = other.parse(url_parts)
+                if result is not None:
+                    break
+        if result is not None:
+            _normalize(result, lower_case, trimmed, collapse_whitespace)
+            if not (use_naive_method and _prefers_naive(result, candidates)):
+                return result
+
+    if not use_naive_method:
+        return None  # Tried to get keyword from non SERP URL
+
+    return _extract_naive(url_parts) or result
+
+
+def _prefers_naive(result, candidates):
+    """
+    Whether the naive method should be tried before settling for a result:
+    an empty keyword found on a host which only matched rules as a
+    subdomain of their host, where naive detection may find the keyword.
+    """
+    return not result.keyword and bool(candidates) and candidates[0][0]
+
+
+def _extract_naive(url_parts):
+    """
+    Find a keyword with the naive method of detection, see :func:`extract`.
+    """
+    if _naive_re.search(url_parts.netloc):
+        query = _scan_query(url_parts.query, _naive_param_set, keep_blank_values=True)
+        for param in _naive_params:
+            if param in query:
+                tld_res = _tld_extract(url_parts.netloc)
+                return ExtractResult(tld_res.domain, query[param][0], None)
+
+    return None  # Naive method could not detect a keyword either
+
+
+def _normalize(result, lower_case, trimmed, collapse_whitespace):
+    """
+    Normalize the keyword of an :class:`ExtractResult` in place for a set of
+    :func:`extract` options.
+    """
+    options = (lower_case, trimmed, collapse_whitespace)
+    steps = _normalization_steps.get(options)
+    if steps is None:
+        steps = _get_normalization_steps(*options)
+    if steps:
+        keyword = result.keyword
+        for step in steps:
+            keyword = step(keyword)
+        result.keyword = keyword
+
+
+def _collapse_whitespace(keyword):
+    return _whitespace_re.sub(" ", keyword)
+
+
+def _get_normalization_steps(lower_case, trimmed, collapse_whitespace):
+    """
+    Return the functions to run on a keyword for a set of :func:`extract`
+    options, in order.
+    """
+    steps = []
     if lower_case:
-        result.keyword = result.keyword.lower()
+        steps.append(text_type.lower)
     if trimmed:
-        result.keyword = result.keyword.strip()
+        steps.append(text_type.strip)
     if collapse_whitespace:
-        result.keyword = re.sub(r"\s+", " ", result.keyword, re.UNICODE)
+        steps.append(_collapse_whitespace)
+    steps.extend(_keyword_normalizers)
+    steps = tuple(steps)
+    _normalization_steps[(lower_case, trimmed, collapse_whitespace)] = steps
+    return steps
 
-    return result
+
+def _format_csv(result):
+    """
+    Format an extraction result as a line of the command line's CSV output.
+    """
+    if result is None:
+        return '"",""\n'
+    escape_quotes = lambda s: s.replace('"', '\\"')
+    return '"{}","{}"\n'.format(
+        escape_quotes(result.engine_name), escape_quotes(result.keyword)
+    )
+
+
+def _format_jsonl(result):
+    """
+    Format an extraction result as a line of the command line's JSON lines
+    output.
+    """
+    if result is None:
+        record = {"engine_name": None, "keyword": None}
+    else:
+        record = {"engine_name": result.engine_name, "keyword": result.keyword}
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+
+_output_formatters = {"csv": _format_csv, "jsonl": _format_jsonl}
+
+
+def _extract_lines(output_format, urls):
+    """
+    Extract a batch of URLs and return the formatted output for all of them.
+    Used by the command line, possibly in worker processes.
+    """
+    format_result = _output_formatters[output_format]
+    return "".join(format_result(res) for res in extract_many(urls))
+
+
+def _read_urls(stream, input_format, column):
+    """
+    Generate the URLs in a stream of newline-delimited URLs, CSV rows or JSON
+    lines.  Exactly one value is generated for every input record so that
+    output lines match input lines.
+    """
+    if input_format == "csv":
+        for row in csv.DictReader(stream):
+            yield row.get(column) or ""
+    elif input_format == "jsonl":
+        for line in stream:
+            try:
+                url = json.loads(line).get(column)
+            except (ValueError, AttributeError):
+                url = None
+            yield url if isinstance(url, string_types) else ""
+    else:
+        for line in stream:
+            yield line.rstrip("\r\n")
+
+
+def _open_input(filename):
+    if filename == "-":
+        # Decoded like files, not with the locale's encoding, and left open
+        return io.open(
+            sys.stdin.fileno(),
+            encoding="utf-8",
+            errors="ignore",
+            newline="",
+            closefd=False,
+        )
+    return io.open(filename, encoding="utf-8", errors="ignore", newline="")
 
 
 def main():
@@ -735,6 +3236,54 @@ def main():
         action="store_true",
         help="Print a list of all the SearchEngineParsers.",
     )
+    parser.add_argument(
+        "-f",
+        "--file",
+        dest="files",
+        metavar="FILE",
+        action="append",
+        default=[],
+        help="Read URLs from a file, or from stdin if FILE is -. May be "
+        "given more than once.",
+    )
+    parser.add_argument(
+        "--input-format",
+        choices=("lines", "csv", "jsonl"),
+        default="lines",
+        help="Format of the files given with --file: one URL per line, or a "
+        "column of a CSV file or of JSON lines (default: lines).",
+    )
+    parser.add_argument(
+        "-c",
+        "--column",
+        default="url",
+        help="Name of the CSV column or JSON key holding URLs (default: url).",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=sorted(_output_formatters),
+        default="csv",
+        help="Format of the results (default: csv).",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="FILE",
+        help="Write results to a file instead of stdout.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to extract keywords with (default: 1).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="Number of URLs handed to a worker at a time (default: 1000).",
+    )
 
     args = parser.parse_args()
 
@@ -747,21 +3296,44 @@ def main():
         print("{} parsers.".format(len(engines)))
         sys.exit(0)
 
-    if len(args.input) == 0:
+    if len(args.input) == 0 and len(args.files) == 0:
         parser.print_usage()
         sys.exit(1)
-
-    escape_quotes = lambda s: re.sub(r'"', '\\"', s)
-
-    for url in args.input:
-        res = extract(url)
-        if res is None:
-            res = ['""', '""']
-        else:
-            res = [escape_quotes(res.engine_name), escape_quotes(res.keyword)]
-            res = ['"{}"'.format(r) for r in res]
-        print(",".join(res))
+    if args.workers < 1 or args.batch_size < 1:
+        parser.error("--workers and --batch-size must be at least 1")
+
+    def urls():
+        for url in args.input:
+            yield url
+        for filename in args.files:
+            stream = _open_input(filename)
+            try:
+                for url in _read_urls(stream, args.input_format, args.column):
+                    yield url
+            finally:
+                stream.close()
+
+    if args.output:
+        output = io.open(args.output, "w", encoding="utf-8")
+    else:
+        output = sys.stdout
+
+    from .parallel import map_chunks
+
+    extract_lines = functools.partial(_extract_lines, args.output_format)
+    try:
+        for lines in map_chunks(
+            extract_lines, urls(), processes=args.workers, chunksize=args.batch_size
+        ):
+            output.write(lines)
+    finally:
+        if output is not sys.stdout:
+            output.close()
 
 
 if __name__ == "__main__":
+    # Run the module's own copy of main, so that the classes of the parsers
+    # loaded from the snapshot are the ones checked against
+    from serpextract.serpextract import main
+
     main()
@@ -0,0 +1,349 @@
+"""Compare versions of the search engine definitions and re-extract only the
+referrers that a new version affects.
+
+Every match rule of a ``search_engines.json`` (a domain such as
+``google.{}``, optionally with a path) gets a content hash of its effective
+definition: engine name, keyword extractors, link macro, charsets and hidden
+keyword paths.  ``update_list.py`` writes these hashes to
+``search_engines.hashes.json`` next to the definitions.  Two versions differ
+for a rule when it was added, removed or its hash changed, and a referrer is
+only affected by the update if its host and path resolve to one of those
+rules::
+
+    $ python -m serpextract.versions old/search_engines.json new/search_engines.json
+
+The old version can also be given by its hashes file alone, e.g. the one
+shipped with the release the referrers were extracted with::
+
+    $ python -m serpextract.versions old/search_engines.hashes.json
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import argparse
+import hashlib
+import itertools
+import json
+
+from six import iteritems, string_types
+
+from .serpextract import (
+    EngineRegistry,
+    SearchEngineParser,
+    _definitions_digest,
+    _get_matomo_engines,
+    _iter_rule_definitions,
+    extract_many,
+    get_parser,
+    might_be_serp,
+    pkg_resources,
+)
+
+__all__ = (
+    "DefinitionsDiff",
+    "diff_definitions",
+    "reextract",
+    "rule_hashes",
+    "write_rule_hashes",
+)
+
+
+def _read_definitions(definitions):
+    """
+    Return the raw contents of a ``search_engines.json`` given its contents,
+    its path or ``None`` for the one shipped with serpextract.
+    """
+    if definitions is None:
+        return pkg_resources.resource_string("serpextract", "search_engines.json")
+    if isinstance(definitions, bytes) and definitions.lstrip().startswith(b"{"):
+        return definitions
+    with open(definitions, "rb") as definitions_file:
+        return definitions_file.read()
+
+
+def _hash_definition(definition):
+    """
+    Return a short hash of a rule definition which only depends on its
+    values, not on how they are serialized.
+    """
+    parts = []
+    for value in definition:
+        if value is None:
+            parts.append("\0")
+        elif isinstance(value, list):
+            parts.append("\x1f".join(value))
+        else:
+            parts.append(value)
+    return hashlib.sha1("\x1e".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _rule_definitions(definitions):
+    rules = {}
+    for match_rule, definition in _iter_rule_definitions(
+        _get_matomo_engines(definitions)
+    ):
+        rules[match_rule] = definition
+    return rules
+
+
+def rule_hashes(definitions=None):
+    """
+    Return the content hash of every match rule of a ``search_engines.json``.
+
+    :param definitions: Contents or path of the definitions, defaults to the
+                        ones shipped with serpextract.
+    :type definitions:  ``bytes`` or ``str``
+
+    :returns: a ``dict`` of match rules to ``(engine_name, hash)`` tuples.
+    """
+    rules = _rule_definitions(_read_definitions(definitions))
+    return {
+        match_rule: (definition[0], _hash_definition(definition))
+        for match_rule, definition in iteritems(rules)
+    }
+
+
+def _read_rule_hashes(definitions):
+    """
+    Return the version and rule hashes of a ``search_engines.json`` or of a
+    hashes file written by :func:`write_rule_hashes`, given its contents,
+    its path or ``None`` for the definitions shipped with serpextract.
+
+    :returns: a ``(version, hashes)`` tuple, where ``hashes`` is like the
+              result of :func:`rule_hashes`.
+    """
+    definitions = _read_definitions(definitions)
+    document = json.loads(definitions.decode("utf-8"))
+    rules = document.get("rules")
+    if isinstance(document.get("version"), string_types) and isinstance(rules, dict):
+        hashes = {
+            match_rule: (rule["engine"], rule["hash"])
+            for match_rule, rule in iteritems(rules)
+        }
+        return document["version"], hashes
+    return _definitions_digest(definitions), rule_hashes(definitions)
+
+
+def write_rule_hashes(filename, definitions=None):
+    """
+    Write the content hash of every match rule of a ``search_engines.json``
+    to a JSON file, as an object with the ``version`` (digest) of the
+    definitions and ``rules`` mapping each match rule to its engine name and
+    hash.
+
+    :param filename:    Path of the JSON file to write.
+    :type filename:     ``str``
+
+    :param definitions: Contents or path of the definitions, defaults to the
+                        ones shipped with serpextract.
+    :type definitions:  ``bytes`` or ``str``
+
+    :returns: the number of rules written.
+    """
+    definitions = _read_definitions(definitions)
+    hashes = rule_hashes(definitions)
+    document = {
+        "version": _definitions_digest(definitions),
+        "rules": {
+            match_rule: {"engine": engine_name, "hash": digest}
+            for match_rule, (engine_name, digest) in iteritems(hashes)
+        },
+    }
+    with open(filename, "w") as hashes_file:
+        json.dump(document, hashes_file, indent=2, sort_keys=True)
+    return len(hashes)
+
+
+class DefinitionsDiff(object):
+    """
+    The match rules which differ between two versions of the search engine
+    definitions, see :func:`diff_definitions`.  A diff is true if any rule
+    differs.
+    """
+
+    __slots__ = (
+        "old_version",
+        "new_version",
+        "added",
+        "removed",
+        "changed",
+        "engines",
+        "_registry",
+    )
+
+    def __init__(self, old_version, new_version, added, removed, changed, engines):
+        #: Digests of the old and new definitions
+        self.old_version = old_version
+        self.new_version = new_version
+        #: Sorted lists of match rules
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        #: Sorted list of the names of the engines of those rules, in either
+        #: version
+        self.engines = engines
+        # A registry over the differing rules only, see affects
+        self._registry = None
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        return "DefinitionsDiff(added={}, removed={}, changed={}, engines={})".format(
+            len(self.added), len(self.removed), len(self.changed), len(self.engines)
+        )
+
+    @property
+    def rules(self):
+        """
+        The sorted list of all the match rules which differ.
+        """
+        return sorted(itertools.chain(self.added, self.removed, self.changed))
+
+    def affects(self, serp_url):
+        """
+        Determine if a URL may be extracted differently with the new
+        definitions than with the old ones, i.e. if its host and path resolve
+        to a match rule which differs.  A URL whose most specific rule didn't
+        change but which also matches a less specific rule that did is
+        considered affected.
+
+        :param serp_url: A suspected SERP URL.
+        :type serp_url:  ``str`` or :class:`urlparse.ParseResult`
+
+        :returns: ``True`` or ``False``.
+        """
+        registry = self._registry
+        if registry is None:
+            # Only whether a rule is found matters, not its parser
+            placeholder = SearchEngineParser("", [], None, [])
+            registry = self._registry = EngineRegistry(
+                dict.fromkeys(self.rules, placeholder)
+            )
+        if not registry.engines or not might_be_serp(serp_url, registry=registry):
+            return False
+        return get_parser(serp_url, registry) is not None
+
+
+def diff_definitions(old, new=None):
+    """
+    Compare two versions of the search engine definitions.
+
+    :param old: Contents or path of the old ``search_engines.json``, or of
+                the hashes file written for it by :func:`write_rule_hashes`.
+    :type old:  ``bytes`` or ``str``
+
+    :param new: Contents or path of the new ``search_engines.json``, defaults
+                to the one shipped with serpextract.
+    :type new:  ``bytes`` or ``str``
+
+    :returns: a :class:`DefinitionsDiff`.
+    """
+    old_version, old_hashes = _read_rule_hashes(old)
+    new = _read_definitions(new)
+    new_hashes = rule_hashes(new)
+    added = sorted(set(new_hashes) - set(old_hashes))
+    removed = sorted(set(old_hashes) - set(new_hashes))
+    changed = sorted(
+        match_rule
+        for match_rule, value in iteritems(new_hashes)
+        if match_rule in old_hashes and old_hashes[match_rule] != value
+    )
+    engines = {new_hashes[match_rule][0] for match_rule in added}
+    engines.update(old_hashes[match_rule][0] for match_rule in removed)
+    for match_rule in changed:
+        engines.add(old_hashes[match_rule][0])
+        engines.add(new_hashes[match_rule][0])
+    return DefinitionsDiff(
+        old_version,
+        _definitions_digest(new),
+        added,
+        removed,
+        changed,
+        sorted(engines),
+    )
+
+
+def reextract(records, diff, chunksize=1000, **kwargs):
+    """
+    Bring the results of an earlier extraction up to date with new search
+    engine definitions, re-extracting only the URLs which the new
+    definitions affect (see :meth:`DefinitionsDiff.affects`).  Every other
+    result is passed through as it is.
+
+    :param records:   ``(serp_url, result)`` pairs from the earlier
+                      extraction, where ``result`` can be anything.
+    :type records:    an iterable of ``tuple``
+
+    :param diff:      Differences between the definitions the results were
+                      extracted with and the new ones.
+    :type diff:       :class:`DefinitionsDiff`
+
+    :param chunksize: Number of records processed at once.
+    :type chunksize:  ``int``
+
+    :param kwargs:    ``lower_case``, ``trimmed``, ``collapse_whitespace``,
+                      ``use_naive_method`` or ``registry``, passed on to
+                      :func:`serpextract.extract_many`.  The registry (by
+                      default the default one) should hold the new
+                      definitions.
+
+    :returns: a generator of ``(serp_url, result, reextracted)`` tuples in the
+              order of ``records``, where ``result`` is a new
+              :class:`serpextract.ExtractResult` or ``None`` if
+              ``reextracted`` is ``True``, and the earlier result otherwise.
+    """
+    iterator = iter(records)
+    while True:
+        chunk = list(itertools.islice(iterator, chunksize))
+        if not chunk:
+            return
+        affected = [
+            i for i, (serp_url, _) in enumerate(chunk) if diff.affects(serp_url)
+        ]
+        results = dict(
+            zip(affected, extract_many([chunk[i][0] for i in affected], **kwargs))
+        )
+        for i, (serp_url, result) in enumerate(chunk):
+            if i in results:
+                yield serp_url, results[i], True
+            else:
+                yield serp_url, result, False
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="List the match rules and engines which differ between "
+        "two versions of search_engines.json."
+    )
+    parser.add_argument(
+        "old",
+        help="Path of the old search_engines.json, or of its "
+        "search_engines.hashes.json.",
+    )
+    parser.add_argument(
+        "new",
+        nargs="?",
+        help="Path of the new search_engines.json (default: the one shipped "
+        "with serpextract).",
+    )
+    args = parser.parse_args()
+
+    diff = diff_definitions(args.old, args.new)
+    print("{} -> {}".format(diff.old_version, diff.new_version))
+    for label, match_rules in (
+        ("Added", diff.added),
+        ("Removed", diff.removed),
+        ("Changed", diff.changed),
+    ):
+        for match_rule in match_rules:
+            print("{:<10}{}".format(label, match_rule))
+    print("{} rules and {} engines changed.".format(len(diff.rules), len(diff.engines)))
+    for engine_name in diff.engines:
+        print("  {}".format(engine_name))
+
+
+if __name__ == "__main__":
+    main()
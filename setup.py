@@ -11,7 +11,7 @@ def get_version():
 install_requires = [
     'iso3166 >= 0.4',
     'pylru >= 1.0.3',
-    'tldextract >= 1.2',
+    'tldextract >= 3.0',
     'ruamel.yaml'
 ]
 
@@ -30,6 +30,9 @@ setup(
     description='Easy extraction of keywords from search engine results pages (SERPs).',
     long_description=long_description,
     install_requires=install_requires,
+    extras_require={
+        'frame': ['pandas', 'pyarrow'],
+    },
     include_package_data=True,
     platforms='any',
     classifiers=[
@@ -0,0 +1,128 @@
+from __future__ import absolute_import
+
+import pickle
+import random
+import unittest
+from collections import Counter
+
+from serpextract import extract
+from serpextract.aggregate import KeywordAggregator, aggregate_windows
+
+
+def bing(keyword):
+    return "http://www.bing.com/search?q=" + keyword
+
+
+class TestKeywordAggregator(unittest.TestCase):
+    """Test counting top keywords in bounded memory."""
+
+    def test_exact_counts(self):
+        aggregator = KeywordAggregator()
+        aggregator.update(
+            [
+                bing("foo"),
+                "http://www.reddit.com/",
+                None,
+                bing("bar"),
+                extract(bing("foo")),
+                "http://www.google.com/search?q=foo",
+                bing("Foo"),
+            ]
+        )
+        aggregator.add(bing("bar"), count=3)
+        self.assertEqual(len(aggregator), 8)
+        self.assertEqual(aggregator.engine_names(), [u"Bing", u"Google"])
+        self.assertEqual(aggregator.top(u"Bing"), [(u"bar", 4, 0), (u"foo", 3, 0)])
+        self.assertEqual(aggregator.top(u"Bing", n=1), [(u"bar", 4, 0)])
+        self.assertEqual(aggregator.top(u"Yahoo!"), [])
+        self.assertEqual(
+            aggregator.snapshot(),
+            {u"Bing": [(u"bar", 4, 0), (u"foo", 3, 0)], u"Google": [(u"foo", 1, 0)]},
+        )
+        aggregator.clear()
+        self.assertEqual(len(aggregator), 0)
+        self.assertEqual(aggregator.snapshot(), {})
+
+    def test_heavy_hitters(self):
+        rng = random.Random(42)
+        keywords = [u"heavy{}".format(i) for i in range(5)] * 200
+        keywords += [u"tail{}".format(i) for i in range(2000)]
+        rng.shuffle(keywords)
+        counts = Counter(keywords)
+
+        aggregator = KeywordAggregator(capacity=50)
+        aggregator.update(bing(keyword) for keyword in keywords)
+        self.assertEqual(len(aggregator.engines[u"Bing"].counters), 50)
+        top = aggregator.top(u"Bing", n=5)
+        self.assertEqual(
+            sorted(keyword for keyword, _, _ in top),
+            [u"heavy{}".format(i) for i in range(5)],
+        )
+        for keyword, count, error in aggregator.top(u"Bing", n=None):
+            self.assertGreaterEqual(count, counts[keyword])
+            self.assertLessEqual(count - error, counts[keyword])
+
+    def test_merge(self):
+        rng = random.Random(7)
+        keywords = [u"heavy{}".format(i) for i in range(3)] * 300
+        keywords += [u"tail{}".format(i) for i in range(1000)]
+        rng.shuffle(keywords)
+        counts = Counter(keywords)
+
+        parts = [KeywordAggregator(capacity=30) for _ in range(3)]
+        for i, keyword in enumerate(keywords):
+            parts[i % 3].add(bing(keyword))
+        # Aggregators are pickled on their way back from worker processes
+        parts = [pickle.loads(pickle.dumps(part, 2)) for part in parts]
+        merged = KeywordAggregator(capacity=30)
+        for part in parts:
+            merged.merge(part)
+        self.assertEqual(len(merged), len(keywords))
+        top = merged.top(u"Bing", n=3)
+        self.assertEqual(
+            sorted(keyword for keyword, _, _ in top),
+            [u"heavy{}".format(i) for i in range(3)],
+        )
+        for keyword, count, error in merged.top(u"Bing", n=None):
+            self.assertGreaterEqual(count, counts[keyword])
+            self.assertLessEqual(count - error, counts[keyword])
+
+    def test_aggregate_windows(self):
+        records = [
+            (0, bing("foo")),
+            (59, bing("foo")),
+            (60, bing("bar")),
+            (200, bing("baz")),
+            (210, "http://www.reddit.com/"),
+        ]
+        windows = [
+            (start, aggregator.snapshot())
+            for start, aggregator in aggregate_windows(records, 60)
+        ]
+        self.assertEqual(
+            windows,
+            [
+                (0, {u"Bing": [(u"foo", 2, 0)]}),
+                (60, {u"Bing": [(u"bar", 1, 0)]}),
+                (180, {u"Bing": [(u"baz", 1, 0)]}),
+            ],
+        )
+
+        # Windows spanning several chunks count the same as one by one
+        records = [(i // 7, bing("k{}".format(i % 5))) for i in range(30)]
+        expected = {}
+        for timestamp, url in records:
+            start = timestamp - timestamp % 2
+            expected.setdefault(start, KeywordAggregator(capacity=3)).add(url)
+        windows = aggregate_windows(records, 2, capacity=3, chunksize=4)
+        self.assertEqual(
+            [(start, aggregator.snapshot()) for start, aggregator in windows],
+            [(start, expected[start].snapshot()) for start in sorted(expected)],
+        )
+
+    def test_capacity(self):
+        self.assertRaises(ValueError, KeywordAggregator, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
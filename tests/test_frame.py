@@ -0,0 +1,92 @@
+from __future__ import absolute_import
+
+import io
+import unittest
+
+from six import string_types
+
+from serpextract import extract
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from serpextract.frame import extract_arrow, extract_parquet, extract_series
+
+
+class TestFrame(unittest.TestCase):
+    """Test extracting keywords from pandas and pyarrow columns."""
+
+    urls = [
+        "http://www.google.co.uk/url?sa=t&rct=j&q=hello&source=web&cd=1",
+        "http://www.reddit.com/",
+        None,
+        "http://www.bing.com/search?q=United+States",
+        "http://www.baidu.com/s?wd=%E4%BD%A0%E5%A5%BD",
+        "http://www.google.co.uk/url?sa=t&rct=j&q=hello&source=web&cd=1",
+        None,
+    ]
+
+    def assertSameResults(self, engine_names, keywords):
+        self.assertEqual(len(engine_names), len(self.urls))
+        self.assertEqual(len(keywords), len(self.urls))
+        for url, engine_name, keyword in zip(self.urls, engine_names, keywords):
+            expected = extract(url) if url is not None else None
+            if expected is None:
+                self.assertFalse(isinstance(engine_name, string_types))
+                self.assertFalse(isinstance(keyword, string_types))
+            else:
+                self.assertEqual(engine_name, expected.engine_name)
+                self.assertEqual(keyword, expected.keyword)
+
+    @unittest.skipIf(pandas is None, "pandas is not installed")
+    def test_extract_series(self):
+        series = pandas.Series(self.urls, index=range(10, 10 + len(self.urls)))
+        frame = extract_series(series)
+        self.assertEqual(list(frame.columns), ["engine_name", "keyword"])
+        self.assertEqual(list(frame.index), list(series.index))
+        self.assertSameResults(list(frame["engine_name"]), list(frame["keyword"]))
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_extract_arrow(self):
+        for array in (
+            pyarrow.array(self.urls),
+            pyarrow.chunked_array([self.urls[:3], self.urls[3:]]),
+        ):
+            table = extract_arrow(array)
+            self.assertEqual(table.column_names, ["engine_name", "keyword"])
+            self.assertSameResults(
+                table.column("engine_name").to_pylist(),
+                table.column("keyword").to_pylist(),
+            )
+            self.assertEqual(table.column("keyword").null_count, 3)
+
+    @unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+    def test_extract_parquet(self):
+        source = io.BytesIO()
+        pyarrow.parquet.write_table(
+            pyarrow.table({"id": list(range(len(self.urls))), "url": self.urls}),
+            source,
+        )
+        source.seek(0)
+        destination = io.BytesIO()
+        extract_parquet(source, destination)
+        destination.seek(0)
+        table = pyarrow.parquet.read_table(destination)
+        self.assertEqual(table.column_names, ["id", "url", "engine_name", "keyword"])
+        self.assertEqual(table.column("url").to_pylist(), self.urls)
+        self.assertSameResults(
+            table.column("engine_name").to_pylist(),
+            table.column("keyword").to_pylist(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,12 @@
 from __future__ import absolute_import
 
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
 from six.moves.urllib.parse import urlparse
 
@@ -16,6 +23,28 @@ class TestSERPExtractUtilityFunctions(unittest.TestCase):
         parts = urlparse(url)
         self.assertEqual(serp_query_string(parts), expected)
 
+    def test_scan_query(self):
+        scan_query = serpextract._scan_query
+        qs = 'utm=%ZZ&q=a+b&%71=%E4%BD%A0&tbm&q=&x=1&q'
+        keys = {'q', 'tbm'}
+        self.assertEqual(scan_query(qs, keys),
+                         {'q': ['a b', u'\u4f60']})
+        self.assertEqual(scan_query(qs, keys, keep_blank_values=True),
+                         {'q': ['a b', u'\u4f60', '', ''], 'tbm': ['']})
+        self.assertEqual(scan_query('', keys), {})
+
+    def test_decode_query_value(self):
+        decode = serpextract._decode_query_value
+        results = (
+            ('a+b', [], u'a b'),
+            ('%E4%BD%A0', ['gb2312'], u'\u4f60'),
+            ('%C4%E3', ['gb2312'], u'\u4f60'),
+            ('%C4%E3', ['unknown-charset', 'gb2312'], u'\u4f60'),
+            ('%C4%E3', [], u'\ufffd\ufffd'),
+        )
+        for value, charsets, expected in results:
+            self.assertEqual(decode(value, charsets), expected)
+
     def test_is_url_without_path_query_or_fragment(self):
         is_url_without_path_query_or_fragment = \
             serpextract._is_url_without_path_query_or_fragment
@@ -33,5 +62,178 @@ class TestSERPExtractUtilityFunctions(unittest.TestCase):
             actual = is_url_without_path_query_or_fragment(parts)
             self.assertEqual(actual, expected)
 
+    def test_host_index(self):
+        engines = serpextract._get_search_engines()
+        self.assertIn('google.{}', engines)
+        self.assertNotIn('google.de', engines)
+        index = serpextract._get_engine_index()
+        results = (
+            ('google.de', '', 'Google'),
+            ('www.google.com.br', '', 'Google'),
+            ('ca.search.yahoo.com', '', 'Yahoo!'),
+            ('foo.search.yahoo.com', '', 'Yahoo!'),
+            ('foo.images.search.yahoo.com', '', 'Yahoo! Images'),
+            ('google.de', '/cse', 'Google Custom Search'),
+            ('google.de', '/cse/', 'Google Custom Search'),
+            ('google.de', '/csefoo', 'Google'),
+            ('www.google.de', '/cse', 'Google Custom Search'),
+            ('google.ba', '/imgres', 'Google Images'),
+            ('www.google.ba', '/imgres', 'Google Images'),
+            ('search.yahoo.com', '/search/dir', 'Yahoo! Directory'),
+            ('www.search.yahoo.com', '/search/dir', 'Yahoo! Directory'),
+            ('foo.search.yahoo.com', '/search/dir', 'Yahoo!'),
+            ('google.co.uk', '/cse', 'Google'),
+            ('mail.google.com', '', None),
+            ('google.xyz', '', None),
+        )
+        for host, path, expected in results:
+            parser = index.match(engines, host, path)
+            actual = parser.engine_name if parser else None
+            self.assertEqual(actual, expected, host + path)
+
+    def test_is_subdomain(self):
+        results = (
+            ('google.com', False),
+            ('www.google.com', False),
+            ('google.{}', False),
+            ('yahoo.co.jp', False),
+            ('search.yahoo.com', True),
+            ('search.yahoo.co.jp', True),
+            ('{}.search.yahoo.com', True),
+        )
+        for host, expected in results:
+            self.assertEqual(serpextract._is_subdomain(host), expected, host)
+
+    def test_load_snapshot(self):
+        definitions = serpextract.pkg_resources.resource_string(
+            serpextract.__name__, 'search_engines.json')
+        digest = serpextract._definitions_digest(definitions)
+        snapshot = serpextract._load_snapshot(digest)
+        engines = serpextract._build_search_engines(
+            serpextract._get_matomo_engines(definitions))
+        self.assertIsNotNone(snapshot)
+        self.assertEqual(set(snapshot['engines']), set(engines))
+        for domain in ('google.com', 'google.{}', 'baidu.com'):
+            self.assertEqual(repr(snapshot['engines'][domain]),
+                             repr(engines[domain]))
+        metadata = serpextract.pickle.loads(snapshot['metadata'])
+        expected = serpextract._EngineMetadata(engines)
+        self.assertEqual(metadata.rules_by_name, expected.rules_by_name)
+        self.assertEqual(metadata.rules_by_domain, expected.rules_by_domain)
+        self.assertEqual(metadata.rules_by_param, expected.rules_by_param)
+
+    def test_load_stale_snapshot(self):
+        self.assertIsNone(serpextract._load_snapshot('stale'))
+
+    def test_snapshot_header(self):
+        # The digest is checked without unpickling the engine table
+        filename = os.path.join(os.path.dirname(serpextract.__file__),
+                                serpextract._snapshot_resource)
+        with open(filename, 'rb') as snapshot_file:
+            header = serpextract.pickle.load(snapshot_file)
+            self.assertEqual(set(header), {'version', 'digest'})
+            self.assertEqual(header['version'],
+                             serpextract._snapshot_version)
+            self.assertLess(snapshot_file.tell(), 100)
+
+    def test_tld_extract(self):
+        self.assertEqual(serpextract._get_tld_extractor().suffix_list_urls, ())
+        result = serpextract._tld_extract(u'search.example.co.uk')
+        self.assertEqual(result.domain, u'example')
+        self.assertEqual(serpextract._registered_domain(result),
+                         u'example.co.uk')
+        self.assertIs(serpextract._tld_extract(u'search.example.co.uk'), result)
+
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'suffixes.dat')
+            with io.open(filename, 'w') as f:
+                f.write(u'uk\nexample.co.uk\n')
+            serpextract.set_suffix_list(filename)
+            result = serpextract._tld_extract(u'search.example.co.uk')
+            self.assertEqual(serpextract._registered_domain(result),
+                             u'search.example.co.uk')
+        finally:
+            serpextract.set_suffix_list(None)
+            shutil.rmtree(tmpdir)
+        result = serpextract._tld_extract(u'search.example.co.uk')
+        self.assertEqual(serpextract._registered_domain(result),
+                         u'example.co.uk')
+
+    def test_lru_cache(self):
+        cache = serpextract._LRUCache(3)
+        for key in 'abcd':
+            cache.put(key, key.upper())
+        self.assertEqual(len(cache), 3)
+        # Entries which are used again aren't evicted
+        self.assertEqual(cache.get('b'), 'B')
+        cache.put('e', 'E')
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.get('b'), 'B')
+        self.assertEqual(len(cache), 3)
+        cache.size(1)
+        self.assertEqual(len(cache), 1)
+        stats = cache.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']),
+                         (2, 1, 4))
+
+    def test_read_urls(self):
+        read_urls = serpextract._read_urls
+        results = (
+            ('lines', u'http://a.com/\r\n\nhttp://b.com/\n',
+             [u'http://a.com/', u'', u'http://b.com/']),
+            ('csv', u'id,url\n1,http://a.com/\n2,\n',
+             [u'http://a.com/', u'']),
+            ('jsonl', u'{"url": "http://a.com/"}\n{"url": 1}\nnope\n',
+             [u'http://a.com/', u'', u'']),
+        )
+        for input_format, data, expected in results:
+            stream = io.StringIO(data, newline='')
+            actual = list(read_urls(stream, input_format, 'url'))
+            self.assertEqual(actual, expected)
+
+    def test_extract_lines(self):
+        urls = [u'http://www.bing.com/search?q=%22a%22', u'http://a.com/']
+        self.assertEqual(serpextract._extract_lines('csv', urls),
+                         u'"Bing","\\"a\\""\n"",""\n')
+        lines = serpextract._extract_lines('jsonl', urls).splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{'engine_name': 'Bing', 'keyword': '"a"'},
+                          {'engine_name': None, 'keyword': None}])
+
+    def test_main(self):
+        package_dir = os.path.dirname(os.path.dirname(serpextract.__file__))
+        env = dict(os.environ, PYTHONPATH=package_dir)
+        command = [sys.executable, '-m', 'serpextract.serpextract']
+        output = subprocess.check_output(
+            command + ['http://www.google.com/search?q=Main'], env=env)
+        self.assertEqual(output.decode('utf-8').splitlines(),
+                         ['"Google","main"'])
+
+        process = subprocess.Popen(command + ['-f', '-'], env=env,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE)
+        output = process.communicate(b'http://www.bing.com/search?q=a\n')[0]
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(output.decode('utf-8').splitlines(), ['"Bing","a"'])
+
+        # Undecodable bytes are dropped from stdin as from files
+        data = b'http://www.bing.com/search?q=a\xff\r\n'
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, 'urls.txt')
+            with open(filename, 'wb') as f:
+                f.write(data)
+            for args, stdin in ((['-f', filename], None), (['-f', '-'], data)):
+                process = subprocess.Popen(command + args, env=env,
+                                           stdin=subprocess.PIPE,
+                                           stdout=subprocess.PIPE)
+                output = process.communicate(stdin)[0]
+                self.assertEqual(process.returncode, 0)
+                self.assertEqual(output.decode('utf-8').splitlines(),
+                                 ['"Bing","a"'], args)
+        finally:
+            shutil.rmtree(tmpdir)
+
 if __name__ == '__main__':
     unittest.main()
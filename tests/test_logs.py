@@ -0,0 +1,116 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from serpextract import might_be_serp
+from serpextract.logs import (
+    _get_domain_labels,
+    _might_be_serp,
+    extract_log,
+    extract_log_buffer,
+    iter_referrers,
+)
+
+
+LINE = (
+    '10.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET /a?b=\\"c\\" HTTP/1.1" '
+    '200 {size} "{referrer}" "Mozilla/5.0 (X11; \\"quoted\\")"\n'
+)
+
+
+def make_log(referrers):
+    lines = [LINE.format(size=i, referrer=r) for i, r in enumerate(referrers)]
+    lines.insert(2, "not a log line\n")
+    lines.insert(3, '10.0.0.1 - - [10/Oct/2000:13:55:36 -0700] "GET /" 200 - "-" "-"\n')
+    return "".join(lines).encode("utf-8")
+
+
+class TestLogs(unittest.TestCase):
+    """Test extracting keywords from access logs."""
+
+    referrers = [
+        "http://www.google.com/search?q=hello+world",
+        "-",
+        "http://www.example.com/article",
+        "http://www.bing.com/search?q=United+States",
+        "http://search.example.org/?q=naive",
+        "http://www.baidu.com/s?wd=%E4%BD%A0%E5%A5%BD",
+    ]
+
+    def setUp(self):
+        self.log = make_log(self.referrers)
+        self.offsets = [0]
+        for line in self.log.splitlines(True)[:-1]:
+            self.offsets.append(self.offsets[-1] + len(line))
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_iter_referrers(self):
+        referrers = list(iter_referrers(self.log))
+        self.assertEqual(
+            [referrer for _, referrer in referrers],
+            [r.encode("utf-8") for r in self.referrers[:2]]
+            + [b"-"]
+            + [r.encode("utf-8") for r in self.referrers[2:]],
+        )
+        self.assertEqual(
+            [offset for offset, _ in referrers],
+            [o for i, o in enumerate(self.offsets) if i != 2],
+        )
+
+    def test_might_be_serp(self):
+        # Undecoded referrers are prefiltered like might_be_serp does
+        domain_labels = _get_domain_labels()
+        referrers = self.referrers + [
+            "http://www.google.co.uk/url?sa=t",
+            "https://yandex.com.tr:443/search/?text=x",
+            "//www.bing.com/search?q=x",
+            "http://www.example.co.uk/",
+            "http://example.com#google.com",
+        ]
+        for referrer in referrers:
+            for use_naive_method in (False, True):
+                self.assertEqual(
+                    _might_be_serp(
+                        referrer.encode("utf-8"), domain_labels, use_naive_method
+                    ),
+                    might_be_serp(referrer, use_naive_method),
+                    referrer,
+                )
+
+    def test_extract_log_buffer(self):
+        expected = [
+            (self.offsets[0], u"Google", u"hello world"),
+            (self.offsets[5], u"Bing", u"united states"),
+            (self.offsets[7], u"Baidu", u"\u4f60\u597d"),
+        ]
+        self.assertEqual(list(extract_log_buffer(self.log, chunksize=2)), expected)
+        naive = list(extract_log_buffer(self.log, use_naive_method=True))
+        self.assertEqual(naive[2], (self.offsets[6], u"example", u"naive"))
+
+    def test_extract_log(self):
+        filename = os.path.join(self.tmpdir, "access.log")
+        with open(filename, "wb") as f:
+            f.write(self.log)
+        results = list(extract_log(filename))
+        self.assertEqual(results, list(extract_log_buffer(self.log)))
+        for offset, _, _ in results:
+            self.assertTrue(self.log[offset:].startswith(b"10.0.0.1 "))
+
+        # Stopping early releases the file
+        extracted = extract_log(filename)
+        next(extracted)
+        extracted.close()
+
+        empty = os.path.join(self.tmpdir, "empty.log")
+        open(empty, "wb").close()
+        self.assertEqual(list(extract_log(empty)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
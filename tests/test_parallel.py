@@ -0,0 +1,88 @@
+from __future__ import absolute_import
+
+import multiprocessing
+import unittest
+
+from serpextract import (
+    SearchEngineParser,
+    add_custom_parser,
+    extract,
+    get_default_registry,
+    set_default_registry,
+)
+from serpextract.parallel import extract_iter, map_chunks
+
+
+class TestParallel(unittest.TestCase):
+    """Test extracting keywords in a pool of processes."""
+
+    urls = [
+        "http://www.google.co.uk/url?sa=t&rct=j&q=hello&source=web&cd=1",
+        "http://www.reddit.com/",
+        "http://www.bing.com/search?q=United+States",
+        "http://search.piccshare.com/search.php?cat=web&q=test",
+        "http://www.baidu.com/s?wd=%E4%BD%A0%E5%A5%BD",
+    ] * 7
+
+    def assertSameResults(self, results, **kwargs):
+        results = list(results)
+        self.assertEqual(len(results), len(self.urls))
+        for url, res in zip(self.urls, results):
+            expected = extract(url, **kwargs)
+            if expected is None:
+                self.assertIsNone(res)
+            else:
+                self.assertEqual(res.engine_name, expected.engine_name)
+                self.assertEqual(res.keyword, expected.keyword)
+                self.assertIs(res.parser, expected.parser)
+
+    def test_extract_iter(self):
+        self.assertSameResults(extract_iter(self.urls, processes=2, chunksize=3))
+        kwargs = {"lower_case": False, "use_naive_method": True}
+        self.assertSameResults(
+            extract_iter(self.urls, processes=3, chunksize=4, max_pending=1, **kwargs),
+            **kwargs
+        )
+
+    def test_extract_iter_single_process(self):
+        self.assertSameResults(extract_iter(self.urls, processes=1, chunksize=3))
+
+    def test_extract_iter_registry(self):
+        parser = SearchEngineParser(u"PiccShare", u"q", u"/search.php?q={k}", u"utf-8")
+        registry = get_default_registry().with_parser(u"search.piccshare.com", parser)
+        for processes in (1, 2):
+            results = list(
+                extract_iter(self.urls, processes=processes, registry=registry)
+            )
+            self.assertEqual(results[3].engine_name, u"PiccShare")
+            self.assertIs(results[3].parser, parser)
+            self.assertEqual(results[2].engine_name, u"Bing")
+            self.assertIs(results[2].parser, registry.engines[u"bing.com"])
+        self.assertIsNone(extract(self.urls[3]))
+
+    def test_extract_iter_without_fork(self):
+        # Workers which aren't forked are sent the parent's custom parsers
+        get_all_start_methods = multiprocessing.get_all_start_methods
+        get_context = multiprocessing.get_context
+        default_registry = get_default_registry()
+        multiprocessing.get_all_start_methods = lambda: ["spawn"]
+        multiprocessing.get_context = lambda method=None: get_context(method or "spawn")
+        try:
+            add_custom_parser(
+                u"search.piccshare.com",
+                SearchEngineParser(u"PiccShare", u"q", u"/search.php?q={k}", u"utf-8"),
+            )
+            self.assertSameResults(extract_iter(self.urls, processes=2))
+            self.assertEqual(extract(self.urls[3]).engine_name, u"PiccShare")
+        finally:
+            multiprocessing.get_all_start_methods = get_all_start_methods
+            multiprocessing.get_context = get_context
+            set_default_registry(default_registry)
+
+    def test_map_chunks(self):
+        chunks = list(map_chunks(len, range(10), processes=2, chunksize=4))
+        self.assertEqual(chunks, [4, 4, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
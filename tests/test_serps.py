@@ -1,16 +1,47 @@
 from __future__ import absolute_import
 
+import pickle
+import sys
 import unittest
-from six.moves.urllib.parse import urlparse
+from six.moves.urllib.parse import urlparse, urlsplit
 
 from serpextract import (
     SearchEngineParser,
     extract,
+    extract_many,
+    extract_compact,
+    extract_columns,
+    get_engine_id,
+    get_engine_names,
     is_serp,
+    might_be_serp,
     get_all_query_params,
     add_custom_parser,
+    add_keyword_normalizer,
+    remove_keyword_normalizer,
     get_all_query_params_by_domain,
+    get_engine_domains,
+    get_engine_parsers,
+    get_query_param_engines,
+    get_parser,
+    get_parser_cache_stats,
+    get_search_engine_stats,
+    enable_result_cache,
+    disable_result_cache,
+    clear_result_cache,
+    get_result_cache_stats,
+    enable_stats,
+    disable_stats,
+    get_stats,
+    reset_stats,
+    set_parser_cache_size,
+    EngineRegistry,
+    get_default_registry,
+    set_default_registry,
+    reload_search_engines,
+    SearchEnginesWatcher,
 )
+from serpextract.serpextract import ExtractResult
 
 
 class TestSERPs(unittest.TestCase):
@@ -92,6 +123,7 @@ class TestSERPs(unittest.TestCase):
                 u"lenovo",
             ),
             ("https://www.google.it", "Google", u""),
+            ("http://www.google.de/cse?as_q=a&as_eq=b", "Google", u"a -b"),
             (
                 "https://www.google.co.uk/url?sa=t&rct=j&q=&esrc=s&source=web&cd=5&sqi=2&ved=0ahUKEwipjbfT-aPSAhUnCcAKHTbHALEQFgg7MAQ&url=https%3A%2F%2Fwww.thesun.co.uk%2Ftvandshowbiz%2F2735307%2Fantonio-banderas-rushed-to-surrey-hospital-after-suffering-agonising-chest-pains-during-workout%2F&usg=AFQjCNG4c9vrYPeffmVxckMAfRj51PMlpA&bvm=bv.147448319,d.ZGg",
                 "Google",
@@ -134,6 +166,7 @@ class TestSERPs(unittest.TestCase):
                 "Yahoo! Japan",
                 u"",
             ),
+            ("http://www.search.yahoo.com/search/dir?q=x", "Yahoo!", u"x"),
         )
         self.assertValidSERPs(serps)
 
@@ -162,6 +195,23 @@ class TestSERPs(unittest.TestCase):
         )
         self.assertValidSERPs(serps)
 
+    def test_legacy_charsets(self):
+        """Keywords that aren't UTF-8 are decoded with the engine's charsets."""
+        serps = (
+            ("http://www.baidu.com/s?wd=%C4%E3%BA%C3", "Baidu", u"\u4f60\u597d"),
+            (
+                "http://go.mail.ru/search?q=%EF%F0%E8%E2%E5%F2",
+                "Mailru",
+                u"\u043f\u0440\u0438\u0432\u0435\u0442",
+            ),
+            (
+                "http://search.yahoo.co.jp/search?p=%A4%B3%A4%F3%A4%CB%A4%C1%A4%CF",
+                "Yahoo! Japan",
+                u"\u3053\u3093\u306b\u3061\u306f",
+            ),
+        )
+        self.assertValidSERPs(serps)
+
     def test_path_engines(self):
         """Tests for search engines that contain keywords within their paths
         and require regex extraction."""
@@ -188,14 +238,442 @@ class TestSERPs(unittest.TestCase):
         )
 
     def test_custom_parser_implicit(self):
-        from serpextract.serpextract import _get_search_engines, _engines
-
+        registry = get_default_registry()
         self.assertInvalidSERP(self.custom_serp_url)
         add_custom_parser(u"search.piccshare.com", self.custom_parser)
+        try:
+            self.assertValidSERP(
+                self.custom_serp_url, self.custom_parser.engine_name, u"test"
+            )
+        finally:
+            set_default_registry(registry)
+        self.assertInvalidSERP(self.custom_serp_url)
+
+    def test_extract_many(self):
+        urls = [
+            "http://www.bing.com/search?q=United+States",
+            "http://www.reddit.com/",
+            self.custom_serp_url,
+            "http://www.bing.com/search?q=United+States",
+            urlparse("http://www.google.de/search?q=Hallo"),
+            "http://www.bing.com/search?q=hello",
+        ]
+        for kwargs in ({}, {"lower_case": False}, {"use_naive_method": True}):
+            results = extract_many(urls, **kwargs)
+            self.assertEqual(len(results), len(urls))
+            for url, res in zip(urls, results):
+                expected = extract(url, **kwargs)
+                if expected is None:
+                    self.assertIsNone(res)
+                else:
+                    self.assertEqual(res.engine_name, expected.engine_name)
+                    self.assertEqual(res.keyword, expected.keyword)
+                    self.assertIs(res.parser, expected.parser)
+            self.assertIsNot(results[0], results[3])
+
+        results = extract_many(urls[:3], parser=self.custom_parser)
+        self.assertEqual(results[0].keyword, u"united states")
+        self.assertIsNone(results[1])
+        self.assertEqual(results[2].keyword, u"test")
+
+    def test_might_be_serp(self):
+        candidates = (
+            "http://www.google.co.uk/url?sa=t&q=hello",
+            "https://google.de",
+            "http://foo.images.search.yahoo.com/search?p=x",
+            "//www.bing.com/search?q=x",
+            "http://www.example.com/?cx=partner-pub-123&q=x",
+            urlparse("http://www.baidu.com/s?wd=x"),
+            urlparse("http://www.example.com/?cx=partner-pub-123&q=x"),
+            "http://www.example.com/pemonitorhosted/ws/results/Web/x/1/",
+            "http://www.example.com?cx=partner-pub-123&q=x",
+        )
+        for url in candidates:
+            self.assertTrue(might_be_serp(url), url)
+
+        non_candidates = (
+            "http://www.reddit.com/r/python",
+            "https://t.co/abc",
+            "http://example.com?q=www.google.com",
+            "http://example.com#google.com",
+            "not a url",
+            "",
+            "http://search.example.org/?q=test",
+        )
+        for url in non_candidates:
+            self.assertFalse(might_be_serp(url), url)
+            self.assertIsNone(extract(url))
+        self.assertTrue(
+            might_be_serp("http://search.example.org/?q=test", use_naive_method=True)
+        )
+
+        # Answers are remembered per host for each registry
+        url = "http://search.piccshare.com/search.php?q=test"
+        self.assertFalse(might_be_serp(url))
+        registry = get_default_registry().with_parser(
+            u"search.piccshare.com", self.custom_parser
+        )
+        self.assertTrue(might_be_serp(url, registry=registry))
+        self.assertFalse(might_be_serp(url))
+
+        # Other types are left to urlparse, which rejects them
+        for url in (None, urlsplit("http://www.google.com/search?q=x")):
+            self.assertTrue(might_be_serp(url))
+            self.assertRaises(TypeError, extract, url)
+            self.assertRaises(TypeError, is_serp, url)
+            self.assertRaises(TypeError, extract_many, [url])
+
+    def test_rule_generalization(self):
+        # Results of the host index which differ from the chain of special
+        # cases it replaced: rules with a path match www. hosts and longer
+        # paths, and subdomain rules match any subdomain of their host
+        serps = (
+            ("http://www.google.de/custom?q=hello", "Google Custom Search", u"hello"),
+            ("http://google.com/cse/x?q=hello", "Google Custom Search", u"hello"),
+            ("http://www.google.com/products?q=hello", "Google Shopping", u"hello"),
+            (
+                "http://www.google.fr/products/catalog?q=hello",
+                "Google Shopping",
+                u"hello",
+            ),
+            ("http://www.bing.com/images/search?q=hello", "Bing Images", u"hello"),
+            ("http://de.bing.com/images/search/x?q=hello", "Bing Images", u"hello"),
+            (
+                "http://www.search.yahoo.com/search/dir?p=hello",
+                "Yahoo! Directory",
+                u"hello",
+            ),
+            ("http://foo.search.aol.com/aol/search?q=hello", "AOL", u"hello"),
+            (
+                "http://m.r.search.yahoo.com/_ylt=A0/RU=http%3a%2f%2fexample.com%2f/RK=0",
+                "Yahoo!",
+                u"",
+            ),
+        )
+        self.assertValidSERPs(serps)
+
+    def test_rule_fall_through(self):
+        # Rules with a path match their host with or without www.
+        for url in (
+            "http://google.ba/imgres?imgurl=x&prev=/search%3Fq%3Dcats",
+            "http://www.google.ba/imgres?imgurl=x&prev=/search%3Fq%3Dcats",
+        ):
+            self.assertEqual(get_parser(url).engine_name, u"Google Images")
+            self.assertValidSERP(url, "Google Images", u"cats")
+
+        # A rule which finds no keyword falls through to less specific rules
         self.assertValidSERP(
-            self.custom_serp_url, self.custom_parser.engine_name, u"test"
+            "http://www.google.de/cse?q=hello", "Google Custom Search", u"hello"
+        )
+        self.assertValidSERP("http://www.google.de/cse?as_q=a&as_eq=b", "Google", u"a -b")
+
+        # and then to naive detection, also preferred to an empty keyword on
+        # a host which is only matched as a subdomain
+        url = "http://m.search.xfinity.com/?q=hello"
+        self.assertInvalidSERP(url)
+        self.assertValidSERP(url, "xfinity", u"hello", use_naive_method=True)
+        url = "http://m.r.search.yahoo.com/?q=hello"
+        self.assertValidSERP(url, "Yahoo!", u"")
+        self.assertValidSERP(url, "yahoo", u"hello", use_naive_method=True)
+
+    def test_is_serp(self):
+        # is_serp doesn't extract the keyword but must agree with extract
+        urls = (
+            "http://www.google.com/search?q=",
+            "http://www.google.com/search?q",
+            "http://www.google.com/search#q=fragment",
+            "http://www.google.com/search?%71=encoded",
+            "http://www.google.com/search?as_epq=advanced",
+            "http://www.google.com/search?tbm=isch",
+            "http://www.google.com/imgres?imgurl=x&prev=/search%3Fq%3Dprev",
+            "http://www.google.com/imgres?imgurl=x&prev=/search%3Fq%3D",
+            "http://www.google.com/url?sa=t",
+            "http://www.google.com/",
+            "http://www.bing.com/search?form=QBLH",
+            "http://search.example.org/?q=",
+            "http://search.example.org/?p=naive",
+            "http://[www.google.com/search?q=malformed",
+        )
+        for url in urls:
+            for use_naive_method in (False, True):
+                self.assertEqual(
+                    is_serp(url, use_naive_method=use_naive_method),
+                    extract(url, use_naive_method=use_naive_method) is not None,
+                    url,
+                )
+
+        # Subclasses overriding parse are still asked
+        class PathParser(SearchEngineParser):
+            def parse(self, url_parts):
+                if url_parts.path.startswith("/find/"):
+                    return ExtractResult(self.engine_name, url_parts.path[6:], self)
+
+        parser = PathParser(u"Path", u"q", None, u"utf-8")
+        self.assertTrue(is_serp("http://example.com/find/x", parser=parser))
+        self.assertFalse(is_serp("http://example.com/?q=x", parser=parser))
+
+    def test_parser_cache(self):
+        url = "http://www.bing.com/search?q=united+states"
+        get_parser(url)
+        before = get_parser_cache_stats()
+        self.assertEqual(get_parser(url).engine_name, "Bing")
+        self.assertIsNone(get_parser("http://cache-test.example.org/"))
+        self.assertIsNone(get_parser("http://cache-test.example.org/path"))
+        after = get_parser_cache_stats()
+        self.assertEqual(after["hits"] - before["hits"], 2)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+
+        size = after["size"]
+        try:
+            set_parser_cache_size(1)
+            shrunk = get_parser_cache_stats()
+            self.assertEqual(shrunk["length"], 1)
+            self.assertGreater(shrunk["evictions"], after["evictions"])
+            get_parser("http://www.google.com/")
+            self.assertEqual(
+                get_parser_cache_stats()["evictions"], shrunk["evictions"] + 1
+            )
+        finally:
+            set_parser_cache_size(size)
+        self.assertRaises(ValueError, set_parser_cache_size, 0)
+
+    def test_result_cache(self):
+        from serpextract import serpextract
+
+        url = "http://www.bing.com/search?q=United+States"
+        self.assertIsNone(get_result_cache_stats())
+        enable_result_cache(size=2, ttl=60)
+        try:
+            first = extract(url)
+            first.keyword = u"changed"
+            second = extract(url)
+            self.assertEqual(second.keyword, u"united states")
+            self.assertIsNot(first, second)
+            self.assertEqual(extract(url, lower_case=False).keyword, u"United States")
+            self.assertIsNone(extract("http://www.reddit.com/"))
+            self.assertIsNone(extract("http://www.reddit.com/"))
+            results = extract_many([url, url])
+            self.assertEqual(results[1].keyword, u"united states")
+            stats = get_result_cache_stats()
+            self.assertEqual(stats["hits"], 2)
+            self.assertEqual(stats["misses"], 4)
+            self.assertEqual(stats["evictions"], 2)
+            self.assertEqual(stats["length"], 2)
+            self.assertEqual(stats["size"], 2)
+
+            # Entries expire after the TTL
+            clock = serpextract._clock
+            serpextract._clock = lambda: clock() + 61
+            try:
+                self.assertEqual(extract(url).keyword, u"united states")
+            finally:
+                serpextract._clock = clock
+            self.assertEqual(get_result_cache_stats()["expirations"], 1)
+
+            # Adding a parser invalidates the cache
+            custom_url = "http://search.cache-test.example.org/?q=test"
+            self.assertIsNone(extract(custom_url))
+            registry = get_default_registry()
+            add_custom_parser(u"search.cache-test.example.org", self.custom_parser)
+            try:
+                self.assertEqual(get_result_cache_stats()["length"], 0)
+                self.assertEqual(extract(custom_url).keyword, u"test")
+            finally:
+                set_default_registry(registry)
+
+            extract(url)
+            self.assertEqual(get_result_cache_stats()["length"], 1)
+            clear_result_cache()
+            self.assertEqual(get_result_cache_stats()["length"], 0)
+        finally:
+            disable_result_cache()
+        self.assertIsNone(get_result_cache_stats())
+        self.assertRaises(ValueError, enable_result_cache, 0)
+        self.assertRaises(ValueError, enable_result_cache, 10, 0)
+
+    def test_stats(self):
+        urls = [
+            "http://www.google.com/search?q=Google",
+            "http://www.google.com/search?as_q=hello&as_epq=world",
+            "http://www.bing.com/search?q=Bing",
+            "http://search.example.org/?q=naive",
+            "http://[www.google.com/search?q=malformed",
+            "http://www.reddit.com/",
+        ]
+        self.assertIsNone(get_stats())
+        calls = []
+        enable_stats(lambda *args: calls.append(args))
+        try:
+            for url in urls:
+                extract(url, use_naive_method=True)
+            stats = get_stats()
+            self.assertEqual(stats["urls"], 6)
+            self.assertEqual(stats["serp"], 3)
+            self.assertEqual(stats["naive"], 1)
+            self.assertEqual(stats["malformed"], 1)
+            self.assertEqual(stats["not_serp"], 1)
+            self.assertEqual(
+                stats["engines"], {u"Google": 2, u"Bing": 1, u"example": 1}
+            )
+            stages = stats["stages"]
+            self.assertEqual(stages["prefilter"]["calls"], 6)
+            self.assertEqual(stages["urlparse"]["calls"], 5)
+            self.assertEqual(stages["get_parser"]["calls"], 4)
+            self.assertEqual(stages["query"]["calls"], 3)
+            self.assertEqual(stages["parse_google"]["calls"], 2)
+            self.assertEqual(stages["parse"]["calls"], 1)
+            self.assertEqual(stages["normalize"]["calls"], 3)
+            self.assertEqual(stages["naive"]["calls"], 1)
+            self.assertTrue(all(s["seconds"] >= 0 for s in stages.values()))
+
+            self.assertEqual(len(calls), 6)
+            timings, outcome, engine_name = calls[0]
+            self.assertEqual(outcome, "serp")
+            self.assertEqual(engine_name, u"Google")
+            self.assertEqual(
+                sorted(timings),
+                [
+                    "get_parser",
+                    "normalize",
+                    "parse_google",
+                    "prefilter",
+                    "query",
+                    "urlparse",
+                ],
+            )
+            self.assertEqual(calls[-1][1:], ("not_serp", None))
+
+            # Results are the same as without stats
+            def keywords():
+                results = extract_many(urls + urls, use_naive_method=True)
+                return [r and (r.engine_name, r.keyword) for r in results]
+
+            results = keywords()
+            disable_stats()
+            self.assertEqual(results, keywords())
+            enable_stats()
+            extract_many(urls + urls, use_naive_method=True)
+            self.assertEqual(get_stats()["urls"], 6)
+
+            reset_stats()
+            self.assertEqual(get_stats()["urls"], 0)
+            self.assertEqual(get_stats()["stages"], {})
+
+            # Subclasses overriding parse give the same results
+            class PathParser(SearchEngineParser):
+                def parse(self, url_parts):
+                    if url_parts.path.startswith("/find/"):
+                        keyword = url_parts.path[6:]
+                        return ExtractResult(self.engine_name, keyword, self)
+
+            reset_stats()
+            parser = PathParser(u"Path", u"q", None, u"utf-8")
+            result = extract("http://example.com/find/Path", parser=parser)
+            self.assertEqual(result.keyword, u"path")
+            self.assertIsNone(extract("http://example.com/?q=x", parser=parser))
+            stats = get_stats()
+            self.assertEqual(stats["engines"], {u"Path": 1})
+            self.assertEqual(stats["stages"]["parse"]["calls"], 2)
+            self.assertNotIn("query", stats["stages"])
+
+            # A failing callback doesn't break extraction
+            enable_stats(lambda *args: 1 / 0)
+            self.assertEqual(extract(urls[2]).keyword, u"bing")
+        finally:
+            disable_stats()
+        self.assertIsNone(get_stats())
+
+    def test_collapse_whitespace(self):
+        url = "http://www.bing.com/search?q=" + "a+%09" * 40
+        self.assertEqual(extract(url).keyword, u" ".join([u"a"] * 40))
+        self.assertEqual(
+            extract(url, trimmed=False).keyword, u" ".join([u"a"] * 40) + u" "
         )
-        del _engines[u"search.piccshare.com"]
+        self.assertEqual(
+            extract(url, collapse_whitespace=False).keyword,
+            u" \t".join([u"a"] * 40),
+        )
+
+    def test_keyword_normalizer(self):
+        def strip_site(keyword):
+            words = keyword.split(u" ")
+            return u" ".join(w for w in words if not w.startswith(u"site:"))
+
+        url = "http://www.bing.com/search?q=Hello++site%3Aexample.com+World"
+        self.assertEqual(extract(url).keyword, u"hello site:example.com world")
+        add_keyword_normalizer(strip_site)
+        try:
+            self.assertEqual(extract(url).keyword, u"hello world")
+            self.assertEqual(extract(url, lower_case=False).keyword, u"Hello World")
+        finally:
+            remove_keyword_normalizer(strip_site)
+        self.assertEqual(extract(url).keyword, u"hello site:example.com world")
+
+    def test_compact_results(self):
+        names = get_engine_names()
+        self.assertIsNone(names[0])
+        naive_id = get_engine_id(u"(naive)")
+        self.assertEqual(names[naive_id], u"(naive)")
+        self.assertEqual(names[1:naive_id], sorted(names[1:naive_id]))
+        bing_id = get_engine_id(u"Bing")
+        self.assertEqual(names[bing_id], u"Bing")
+
+        result = extract_compact("http://www.bing.com/search?q=United+States")
+        self.assertEqual(result, (bing_id, u"united states"))
+        self.assertEqual(result.engine_id, bing_id)
+        self.assertEqual(result.engine_name, u"Bing")
+        self.assertRaises(AttributeError, setattr, result, "keyword", u"changed")
+        self.assertIsNone(extract_compact("http://www.reddit.com/"))
+
+        # Results unpickled before any engine is numbered still have names
+        module = sys.modules["serpextract.serpextract"]
+        numbered = module._engine_names, module._engine_ids
+        module._engine_names = module._engine_ids = None
+        try:
+            self.assertEqual(pickle.loads(pickle.dumps(result)).engine_name, u"Bing")
+        finally:
+            module._engine_names, module._engine_ids = numbered
+
+        urls = [
+            "http://www.bing.com/search?q=United+States",
+            "http://www.reddit.com/",
+            "http://www.google.de/search?q=Hallo",
+            "http://www.bing.com/search?q=united+states",
+            "http://search.example.org/?q=naive",
+        ]
+        engine_ids, keywords = extract_columns(urls, use_naive_method=True)
+        self.assertEqual(engine_ids.typecode, "H")
+        self.assertEqual(
+            list(engine_ids), [bing_id, 0, get_engine_id(u"Google"), bing_id, naive_id]
+        )
+        self.assertEqual(
+            keywords, [u"united states", None, u"hallo", u"united states", u"naive"]
+        )
+        self.assertIs(keywords[0], keywords[3])
+
+        # Columns are appended to
+        extract_columns(urls[:1], engine_ids, keywords)
+        self.assertEqual(len(engine_ids), 6)
+        self.assertEqual(keywords[-1], u"united states")
+
+        # Naive results from any domain share one ID
+        naive_urls = ["http://search.example{}.org/?q=x".format(i) for i in range(3)]
+        result = extract_compact(naive_urls[0], use_naive_method=True)
+        self.assertEqual(result, (naive_id, u"x"))
+        engine_ids, _ = extract_columns(naive_urls, use_naive_method=True)
+        self.assertEqual(list(engine_ids), [naive_id] * 3)
+        self.assertEqual(get_engine_names(), names)
+
+    def test_shared_parsers(self):
+        self.assertIs(
+            get_parser("http://www.abacho.de/"), get_parser("http://www.abacho.at/")
+        )
+        self.assertIsNot(
+            get_parser("http://www.abacho.de/"), get_parser("http://www.bing.com/")
+        )
+        stats = get_search_engine_stats()
+        self.assertGreater(stats["parsers"], 0)
+        self.assertLess(stats["parsers"], stats["domains"])
 
     def test_naive_detection(self):
         self.assertInvalidSERP(self.custom_serp_url)
@@ -233,6 +711,188 @@ class TestSERPs(unittest.TestCase):
         self.assertEqual(params_by_domain["goo.ne.jp"], goo_ne_jp_params)
         self.assertEqual(params_by_domain["t-online.de"], t_online_params)
 
+    def test_engine_metadata(self):
+        from serpextract import serpextract
+
+        self.assertIn(u"{}.bing.com", get_engine_domains(u"Bing"))
+        self.assertEqual(
+            [parser.engine_name for parser in get_engine_parsers(u"Bing")], [u"Bing"]
+        )
+        self.assertIn(u"Baidu", get_query_param_engines(u"wd"))
+        self.assertEqual(get_engine_domains(u"Nope"), [])
+        self.assertEqual(get_engine_parsers(u"Nope"), [])
+        self.assertEqual(get_query_param_engines(u"nope"), [])
+
+        # Custom parsers are reflected in every index
+        rule = u"search.metadata-test.org"
+        parser = SearchEngineParser(u"MetadataTest", u"mtq", u"/?mtq={k}", u"utf-8")
+        other = SearchEngineParser(u"MetadataOther", u"moq", u"/?moq={k}", u"utf-8")
+        registry = get_default_registry()
+        try:
+            add_custom_parser(rule, parser)
+            self.assertEqual(get_engine_domains(u"MetadataTest"), [rule])
+            self.assertEqual(get_engine_parsers(u"MetadataTest"), [parser])
+            self.assertEqual(get_query_param_engines(u"mtq"), [u"MetadataTest"])
+            self.assertIn(u"mtq", get_all_query_params())
+            params_by_domain = get_all_query_params_by_domain()
+            self.assertEqual(params_by_domain[u"metadata-test.org"], [u"mtq"])
+
+            add_custom_parser(rule, other)
+            self.assertEqual(get_engine_domains(u"MetadataTest"), [])
+            self.assertEqual(get_engine_domains(u"MetadataOther"), [rule])
+            self.assertEqual(get_query_param_engines(u"mtq"), [])
+            self.assertNotIn(u"mtq", get_all_query_params())
+            params_by_domain = get_all_query_params_by_domain()
+            self.assertEqual(params_by_domain[u"metadata-test.org"], [u"moq"])
+        finally:
+            set_default_registry(registry)
+
+    def test_engine_registry(self):
+        import pickle
+
+        default = get_default_registry()
+        self.assertIs(get_default_registry(), default)
+        if not isinstance(default.engines, dict):
+            with self.assertRaises(TypeError):
+                default.engines[u"x.org"] = self.custom_parser
+
+        # Adding a parser leaves the original registry unchanged
+        rule = u"search.piccshare.com"
+        registry = default.with_parser(rule, self.custom_parser)
+        self.assertNotIn(rule, default.engines)
+        self.assertIs(registry.engines[rule], self.custom_parser)
+        self.assertEqual(len(registry), len(default) + 1)
+        self.assertIs(get_default_registry(), default)
+
+        # Registries can be passed to the functions of the module
+        self.assertIsNone(extract(self.custom_serp_url))
+        result = extract(self.custom_serp_url, registry=registry)
+        self.assertEqual(result.keyword, u"test")
+        self.assertTrue(is_serp(self.custom_serp_url, registry=registry))
+        self.assertTrue(might_be_serp(self.custom_serp_url, registry=registry))
+        self.assertIs(get_parser(self.custom_serp_url, registry), self.custom_parser)
+        results = extract_many([self.custom_serp_url] * 2, registry=registry)
+        self.assertEqual([r.keyword for r in results], [u"test", u"test"])
+        self.assertEqual(get_engine_domains(u"PiccShare", registry), [rule])
+        self.assertEqual(get_engine_domains(u"PiccShare"), [])
+
+        # A registry built from definitions or unpickled works the same
+        definitions = (
+            b'{"PiccShare": [{"urls": ["search.piccshare.com"], "params": ["q"]}]}'
+        )
+        loaded = EngineRegistry.load(definitions)
+        self.assertEqual(list(loaded.engines), [rule])
+        result = extract(self.custom_serp_url, registry=loaded)
+        self.assertEqual(result.keyword, u"test")
+        unpickled = pickle.loads(pickle.dumps(registry))
+        self.assertEqual(set(unpickled.engines), set(registry.engines))
+
+        # Replacing the default registry
+        try:
+            set_default_registry(registry)
+            self.assertEqual(extract(self.custom_serp_url).keyword, u"test")
+        finally:
+            set_default_registry(default)
+        self.assertIsNone(extract(self.custom_serp_url))
+
+    def test_engine_registry_threads(self):
+        import threading
+
+        urls = [
+            "http://www.google.com/search?q=thread+{}".format(i % 50)
+            for i in range(2000)
+        ]
+        expected = [extract(url).keyword for url in urls]
+        registry = EngineRegistry(get_default_registry().engines)
+        results = []
+        errors = []
+
+        def worker():
+            try:
+                results.append(
+                    [extract(url, registry=registry).keyword for url in urls]
+                )
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [expected] * 8)
+
+    def test_reload_search_engines(self):
+        import hashlib
+        import json
+        import os
+        import shutil
+        import tempfile
+
+        import pkg_resources
+
+        default = get_default_registry()
+        definitions = json.loads(
+            pkg_resources.resource_string("serpextract", "search_engines.json")
+        )
+        definitions["ReloadTest"] = [
+            {"urls": ["search.reload-test.org"], "params": ["rq"]}
+        ]
+        url = "http://search.reload-test.org/?rq=reloaded"
+        temp_dir = tempfile.mkdtemp()
+        filename = os.path.join(temp_dir, "search_engines.json")
+        with open(filename, "w") as json_file:
+            json.dump(definitions, json_file)
+        with open(filename, "rb") as json_file:
+            digest = hashlib.sha1(json_file.read()).hexdigest()
+
+        try:
+            add_custom_parser(u"search.piccshare.com", self.custom_parser)
+            self.assertIsNone(extract(url))
+            self.assertEqual(reload_search_engines(filename), digest)
+            self.assertEqual(get_default_registry().version, digest)
+            self.assertEqual(extract(url).keyword, u"reloaded")
+            # Custom parsers survive reloads
+            self.assertEqual(extract(self.custom_serp_url).keyword, u"test")
+            # Earlier registries are left as they were
+            self.assertIsNone(extract(url, registry=default))
+
+            # The watcher only reloads when the file changes
+            versions = []
+            watcher = SearchEnginesWatcher(filename, callback=versions.append)
+            self.assertIsNone(watcher.check())
+            del definitions["ReloadTest"]
+            with open(filename, "w") as json_file:
+                json.dump(definitions, json_file, indent=1)
+            os.utime(filename, (0, 0))
+            version = watcher.check()
+            self.assertEqual(versions, [version])
+            self.assertNotEqual(version, digest)
+            self.assertIsNone(extract(url))
+            self.assertIsNone(watcher.check())
+
+            # Broken definitions leave the current registry in place
+            with open(filename, "w") as json_file:
+                json_file.write("{")
+            os.utime(filename, (1, 1))
+            self.assertRaises(ValueError, watcher.check)
+            self.assertEqual(get_default_registry().version, version)
+
+            # The thread checks the file when it starts
+            with open(filename, "w") as json_file:
+                json.dump(definitions, json_file, indent=2)
+            os.utime(filename, (2, 2))
+            watcher = SearchEnginesWatcher(filename, 60, callback=versions.append)
+            watcher.start()
+            watcher.stop()
+            self.assertFalse(watcher.is_alive())
+            self.assertEqual(len(versions), 2)
+            self.assertEqual(get_default_registry().version, versions[-1])
+        finally:
+            set_default_registry(default)
+            shutil.rmtree(temp_dir)
+
     def test_invalid_serps(self):
         invalid_serps = (
             "http://www.google.com/reader",
@@ -0,0 +1,125 @@
+from __future__ import absolute_import
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import pkg_resources
+
+from serpextract import EngineRegistry, extract
+from serpextract.versions import (
+    diff_definitions,
+    reextract,
+    rule_hashes,
+    write_rule_hashes,
+)
+
+
+def load_definitions():
+    return json.loads(
+        pkg_resources.resource_string("serpextract", "search_engines.json")
+    )
+
+
+def dump_definitions(definitions):
+    return json.dumps(definitions, sort_keys=True).encode("utf-8")
+
+
+class TestVersions(unittest.TestCase):
+    """Test comparing versions of the search engine definitions."""
+
+    def setUp(self):
+        definitions = load_definitions()
+        self.old = dump_definitions(definitions)
+        definitions["Bing"][0]["params"] = ["q", "bq"]
+        del definitions["Baidu"]
+        definitions["VersionTest"] = [
+            {"urls": ["search.version-test.org"], "params": ["vq"]}
+        ]
+        self.new = dump_definitions(definitions)
+
+    def test_rule_hashes(self):
+        hashes = rule_hashes()
+        self.assertEqual(hashes[u"google.{}"][0], u"Google")
+        self.assertEqual(len(hashes[u"google.{}"][1]), 16)
+        # Hashes depend on the definitions, not on how they are written
+        self.assertEqual(rule_hashes(self.old), hashes)
+        pretty = json.dumps(load_definitions(), indent=4).encode("utf-8")
+        self.assertEqual(rule_hashes(pretty), hashes)
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(temp_dir, "hashes.json")
+            self.assertEqual(write_rule_hashes(filename, self.old), len(hashes))
+            with open(filename) as hashes_file:
+                written = json.load(hashes_file)
+            self.assertEqual(
+                written["rules"][u"google.{}"],
+                {"engine": u"Google", "hash": hashes[u"google.{}"][1]},
+            )
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_diff_definitions(self):
+        self.assertFalse(diff_definitions(self.old, self.old))
+
+        diff = diff_definitions(self.old, self.new)
+        self.assertTrue(diff)
+        self.assertEqual(diff.added, [u"search.version-test.org"])
+        self.assertIn(u"baidu.com", diff.removed)
+        self.assertIn(u"bing.com", diff.changed)
+        self.assertNotIn(u"google.{}", diff.rules)
+        self.assertEqual(diff.engines, [u"Baidu", u"Bing", u"VersionTest"])
+        self.assertNotEqual(diff.old_version, diff.new_version)
+
+        # The old version can be given by its hashes
+        temp_dir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(temp_dir, "hashes.json")
+            write_rule_hashes(filename, self.old)
+            from_hashes = diff_definitions(filename, self.new)
+        finally:
+            shutil.rmtree(temp_dir)
+        self.assertEqual(from_hashes.rules, diff.rules)
+        self.assertEqual(from_hashes.engines, diff.engines)
+        self.assertEqual(from_hashes.old_version, diff.old_version)
+        # The shipped hashes are those of the shipped definitions
+        shipped = pkg_resources.resource_filename(
+            "serpextract", "search_engines.hashes.json"
+        )
+        self.assertFalse(diff_definitions(shipped))
+
+        self.assertTrue(diff.affects("http://www.bing.com/search?q=a"))
+        self.assertTrue(diff.affects("http://www.baidu.com/s?wd=a"))
+        self.assertTrue(diff.affects("http://search.version-test.org/?vq=a"))
+        self.assertFalse(diff.affects("http://www.google.com/search?q=a"))
+        self.assertFalse(diff.affects("http://www.example.com/"))
+
+    def test_reextract(self):
+        urls = [
+            "http://www.google.com/search?q=google",
+            "http://www.bing.com/search?bq=bing",
+            "http://www.baidu.com/s?wd=baidu",
+            "http://search.version-test.org/?vq=version",
+            "http://www.example.com/",
+        ]
+        old_registry = EngineRegistry.load(self.old)
+        records = [(url, extract(url, registry=old_registry)) for url in urls]
+        self.assertIsNone(records[1][1])
+
+        registry = EngineRegistry.load(self.new)
+        diff = diff_definitions(self.old, self.new)
+        results = list(reextract(records, diff, chunksize=2, registry=registry))
+        self.assertEqual([r[0] for r in results], urls)
+        self.assertEqual([r[2] for r in results], [False, True, True, True, False])
+        self.assertIs(results[0][1], records[0][1])
+        self.assertEqual(results[1][1].keyword, u"bing")
+        self.assertIsNone(results[2][1])
+        self.assertEqual(results[3][1].engine_name, u"VersionTest")
+        self.assertIsNone(results[4][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
-"""Update the search_engines.pickle list contained within the package.
+"""Update the search_engines.json list contained within the package and the
+compiled search_engines.pickle snapshot built from it.
 Use this before deploying an update"""
 
 from __future__ import absolute_import, division, print_function
 
+import argparse
 import os
 
 try:
@@ -17,7 +19,31 @@ _here = lambda *paths: os.path.join(os.path.dirname(os.path.abspath(__file__)),
                                     *paths)
 
 
+def compile_snapshot():
+    from serpextract.serpextract import _compile_snapshot
+    from serpextract.versions import write_rule_hashes
+
+    filename = _compile_snapshot(_here('serpextract', 'search_engines.pickle'))
+    print('Saved compiled search engine snapshot to {}.'.format(filename))
+
+    # Content hashes of every rule, to find out which rules a later update of
+    # the list changes (see serpextract.versions)
+    filename = _here('serpextract', 'search_engines.hashes.json')
+    count = write_rule_hashes(filename,
+                              _here('serpextract', 'search_engines.json'))
+    print('Saved content hashes of {} rules to {}.'.format(count, filename))
+
+
 def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--snapshot-only', default=False, action='store_true',
+                        help='Only rebuild the compiled snapshot and rule '
+                             'hashes from the existing search_engines.json.')
+    args = parser.parse_args()
+    if args.snapshot_only:
+        compile_snapshot()
+        return
+
     filename = _here('serpextract', 'search_engines.json')
     print('Updating search engine parser definitions.')
 
@@ -36,11 +62,16 @@ def main():
         }
     ]
 
-    with open(filename, "w") as json_file:
+    # Write to a temporary file which is renamed over the old one, so that a
+    # SearchEnginesWatcher never reads a half-written list
+    temp_filename = filename + '.tmp'
+    with open(temp_filename, "w") as json_file:
         json.dump(matomo_engines, json_file, indent=2, sort_keys=True)
+    getattr(os, 'replace', os.rename)(temp_filename, filename)
 
     print('Saved {} search engine parser definitions to {}.'
           .format(len(matomo_engines), filename))
+    compile_snapshot()
 
 
 if __name__ == '__main__':